@@ -54,5 +54,6 @@ cache = Cache(config, logger)
 from .decompose import Decompose
 from .splitter import Splitter
 from .tasking import Tasking
+from .batch import solve_batch
 
 logger.info("Initialized environment %s", config.ENV)
@@ -0,0 +1,50 @@
+from chomp import logger, cache, config
+from chomp.deadline import Deadline
+from chomp.splitter import Splitter, solve_windows
+
+
+def solve_batch(problems):
+    """Solve many (week_demand, min_length, max_length) problems at once
+
+    Identical windows across every problem are solved once. The cache is
+    checked for all of them in one round trip, and the rest share one pool
+    of WINDOW_PROCESSES processes and one TASK_TIMEOUT budget. Returns a
+    calculated Splitter for each problem, in order.
+    """
+    # Cache writes reach the backend together once every problem is solved
+    with cache.deferred_writes():
+        deadline = Deadline(config.TASK_TIMEOUT)
+        splitters = [
+            Splitter(week_demand, min_length, max_length)
+            for (week_demand, min_length, max_length) in problems
+        ]
+
+        window_keys = [splitter.window_keys() for splitter in splitters]
+        keys = [
+            key for splitter_keys in window_keys
+            if splitter_keys is not None for key in splitter_keys
+        ]
+        logger.info("Batch of %s problems has %s windows",
+                    len(problems), len(keys))
+
+        # Overlapping windows depend on each other, so they are solved by
+        # their own splitter afterwards. Their share of the time is kept.
+        overlapping_size = sum(
+            sum(splitter.flat_demand)
+            for splitter, splitter_keys in zip(splitters, window_keys)
+            if splitter_keys is None)
+        solutions = dict(
+            solve_windows(keys, deadline, reserved_size=overlapping_size))
+
+        remaining_size = overlapping_size
+        for splitter, splitter_keys in zip(splitters, window_keys):
+            if splitter_keys is not None:
+                splitter.add_window_solutions(solutions)
+                continue
+
+            size = sum(splitter.flat_demand)
+            splitter.calculate(
+                deadline.share(size / float(max(remaining_size, 1))))
+            remaining_size -= size
+
+        return splitters
@@ -0,0 +1,64 @@
+# Lower bounds on the final coverage of a partial shift collection.
+#
+# Decompose prunes a branch when its bound is not better than the best known
+# solution, so a bound must never exceed the coverage of any solution that
+# the search can reach from the collection.
+
+
+def committed_overage_bound(collection):
+    """Total demand plus the overage that is already committed"""
+    return collection.best_possible_coverage
+
+
+def min_length_run_bound(collection):
+    """Committed bound plus the overage forced by min shift length
+
+    The search only ever starts a shift at the first time demand is unmet,
+    so every future shift starts on a time with unmet demand and at or after
+    the current first unmet time. The times covered by future shifts
+    therefore form runs that each start on unmet demand and last at least
+    min_length. Any met time inside such a run is overage. A dynamic program
+    over the remaining times finds the cheapest way to lay out those runs,
+    e.g. an isolated one hour spike forces min_length - 1 units of overage.
+    """
+    bound = collection.best_possible_coverage
+    if collection.demand_is_met:
+        return bound
+
+    min_length = collection.min_length
+    first_unmet = collection.get_first_time_demand_not_met()
+
+    # Cheapest overage so far, indexed by the length of the run in progress
+    # (capped at min_length). Index 0 means no run is in progress.
+    infinity = float("inf")
+    costs = [0] + [infinity] * min_length
+
+    for t in range(first_unmet, collection.demand_length):
+        unmet = collection.get_demand_minus_coverage(t) > 0
+        new_costs = [infinity] * (min_length + 1)
+
+        if unmet:
+            # Runs may only start here, and this time must be covered
+            new_costs[1] = costs[0]
+        else:
+            # Either stay uncovered or cover this time as overage
+            new_costs[0] = min(costs[0], costs[min_length])
+
+        overage = 0 if unmet else 1
+        for length in range(1, min_length + 1):
+            if costs[length] == infinity:
+                continue
+            extended = min(length + 1, min_length)
+            new_costs[extended] = min(new_costs[extended],
+                                      costs[length] + overage)
+
+        costs = new_costs
+
+    forced_overage = min(costs[0], costs[min_length])
+    return bound + forced_overage
+
+
+LOWER_BOUNDS = {
+    "committed_overage": committed_overage_bound,
+    "min_length_run": min_length_run_bound,
+}
@@ -1,38 +1,376 @@
-import memcache
-import json
+from collections import OrderedDict
+from contextlib import contextmanager
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 import hashlib
+import struct
+import zlib
+
+from chomp.cache_backends import CACHE_BACKENDS
+
+# Shifts are cached as a header of (version, flags, number of triples),
+# then (start, length, count) triples for runs of identical shifts.
+SHIFTS_VERSION = 1
+_SHIFTS_HEADER = struct.Struct("<BBI")
+_FLAG_ZLIB = 1  # Triples are zlib compressed
+_FLAG_WIDE = 2  # Triples are 32 bit rather than 16 bit
+
+# Bump to start over with new keys, e.g. when cached answers change meaning
+KEY_VERSION = 1
+
+
+def encode_shifts(shifts, compress_bytes):
+    """Pack {"start", "length"} shifts into a compact string
+
+    Triples longer than compress_bytes are zlib compressed if that helps.
+    """
+    triples = []
+    for shift in shifts:
+        start = shift["start"]
+        length = shift["length"]
+        if triples and triples[-1][0] == start and triples[-1][1] == length:
+            triples[-1][2] += 1
+        else:
+            triples.append([start, length, 1])
+
+    values = [value for triple in triples for value in triple]
+    flags = 0
+    value_format = "H"
+    if max(values) > 0xFFFF:
+        flags |= _FLAG_WIDE
+        value_format = "I"
+
+    body = struct.pack("<%d%s" % (len(values), value_format), *values)
+    if len(body) > compress_bytes:
+        compressed = zlib.compress(body)
+        if len(compressed) < len(body):
+            body = compressed
+            flags |= _FLAG_ZLIB
+
+    return _SHIFTS_HEADER.pack(SHIFTS_VERSION, flags, len(triples)) + body
+
+
+def decode_shifts(data):
+    """Unpack shifts from encode_shifts, in the same order
+
+    Returns None for encodings from another version, which count as a miss.
+    Lists of shifts cached before encoding existed are returned as they are.
+    """
+    if not isinstance(data, str):
+        return data
+
+    version, flags, triple_count = _SHIFTS_HEADER.unpack_from(data)
+    if version != SHIFTS_VERSION:
+        return None
+
+    body = data[_SHIFTS_HEADER.size:]
+    if flags & _FLAG_ZLIB:
+        body = zlib.decompress(body)
+    value_format = "I" if flags & _FLAG_WIDE else "H"
+    values = struct.unpack("<%d%s" % (3 * triple_count, value_format), body)
+
+    triples = zip(values[0::3], values[1::3], values[2::3])
+    return [{
+        "start": start,
+        "length": length
+    } for start, length, count in triples for _ in range(count)]
+
+
+class LocalCache(object):
+    """Bounded in-process cache that evicts the least recently used entry
+
+    Values are stored pickled, so their size is known and every read
+    returns a fresh copy that callers may change.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the value for a key, or None"""
+        data = self._entries.pop(key, None)
+        if data is None:
+            self.misses += 1
+            return None
+
+        # Re-insert to mark it as recently used
+        self._entries[key] = data
+        self.hits += 1
+        return pickle.loads(data)
+
+    def set(self, key, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+
+        if len(data) > self.max_bytes or self.max_entries <= 0:
+            return
+
+        self._entries[key] = data
+        self.size += len(data)
+        while len(self._entries) > self.max_entries or \
+                self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
 
 
 class Cache():
-    """Subproblem caching"""
+    """Subproblem caching
+
+    Reads check an in-process LocalCache before the shared backend picked
+    by CACHE_BACKEND, e.g. memcached. Writes go to both, or wait until the
+    end of deferred_writes() to reach the backend together.
+    """
 
     def __init__(self, config, logger):
-        self.mc = memcache.Client(config.MEMCACHED_CONFIG)
+        if config.CACHE_BACKEND not in CACHE_BACKENDS:
+            raise Exception("Unknown cache backend %s" % config.CACHE_BACKEND)
+        self.backend = CACHE_BACKENDS[config.CACHE_BACKEND](config)
+        self.local = LocalCache(config.LOCAL_CACHE_ENTRIES,
+                                config.LOCAL_CACHE_BYTES)
         self.config = config
         self.logger = logger
 
+        # Backend writes waiting for the outermost deferred_writes() to end
+        self._deferred = OrderedDict()
+        self._defer_depth = 0
+
     def set(self, shifts=None, **subproblem):
         """Given a subproblem's inputs, store the results"""
-        if shifts is None or len(shifts) is 0:
-            raise Exception("Do not set an empty cache")
+        self._set(*self._encode_entry(subproblem, shifts))
+
+    def set_multi(self, solutions):
+        """Store many (subproblem, shifts) results in one round trip"""
+        entries = OrderedDict(
+            self._encode_entry(subproblem, shifts)
+            for subproblem, shifts in solutions)
+        for key, value in entries.items():
+            self.local.set(key, value)
 
-        self.mc.set(self._subproblem_to_key(subproblem), shifts)
+        if self._defer_depth:
+            self._deferred.update(entries)
+        elif entries:
+            self.backend.set_multi(entries)
+
+    @contextmanager
+    def deferred_writes(self):
+        """Hold backend writes and send them together at the end
+
+        Reads in this process still see the writes through the local tier.
+        Nested uses write when the outermost ends.
+        """
+        self._defer_depth += 1
+        try:
+            yield
+        finally:
+            self._defer_depth -= 1
+            if self._defer_depth == 0 and self._deferred:
+                deferred = self._deferred
+                self._deferred = OrderedDict()
+                self.logger.debug("Writing %s deferred cache entries",
+                                  len(deferred))
+                self.backend.set_multi(deferred)
 
     def get(self, **subproblem):
         """Check cache for a subproblem"""
-        return self.mc.get(self._subproblem_to_key(subproblem))
+        subproblem, mirrored = self._canonicalize(subproblem)
+        shifts = decode_shifts(self._get(self._subproblem_to_key(subproblem)))
+        if shifts is not None and mirrored:
+            shifts = self._mirror_shifts(shifts, subproblem)
+        return shifts
+
+    def get_multi(self, subproblems):
+        """Check cache for many subproblems in one round trip
+
+        Returns a list with the shifts, or None, for each subproblem.
+        """
+        canonical = [
+            self._canonicalize(subproblem) for subproblem in subproblems
+        ]
+        keys = [
+            self._subproblem_to_key(subproblem) for subproblem, _ in canonical
+        ]
+        found = {}
+        for key in keys:
+            value = self.local.get(key)
+            if value is not None:
+                found[key] = value
+            elif key in self._deferred:
+                # The local tier may have evicted a write the backend has
+                # not seen
+                found[key] = self._deferred[key]
+
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = self.backend.get_multi(missing)
+            for key, value in shared.items():
+                self.local.set(key, value)
+            found.update(shared)
+
+        results = []
+        for key, (subproblem, mirrored) in zip(keys, canonical):
+            shifts = decode_shifts(found.get(key))
+            if shifts is not None and mirrored:
+                shifts = self._mirror_shifts(shifts, subproblem)
+            results.append(shifts)
+        return results
+
+    def get_solutions(self, limit, **family):
+        """Solved (demand, shifts) for a family of subproblems
+
+        The first read of a family goes to the backend in one round trip.
+        The family is then kept in the local tier, along with any solutions
+        this process adds, so each search does not pay for a round trip.
+        Solutions other processes add later are seen once it is evicted.
+        """
+        keys = self._family_to_keys(family, limit)
+        solutions = self._get_local_solutions(family, limit)
+        if solutions is None:
+            solutions = self.backend.get_multi(keys)
+            for key in keys:
+                if key in self._deferred:
+                    solutions[key] = self._deferred[key]
+            self.local.set(self._family_to_key(family, limit), solutions)
+        return [solutions[key] for key in keys if key in solutions]
+
+    def add_solution(self, demand, shifts, limit, **family):
+        """Remember a solved demand so that similar ones can start from it
+
+        A family keeps up to limit solutions, each under its own key picked
+        by its demand. Adding one is a single write that replaces whichever
+        solution had that key, so processes never undo each other's writes.
+        """
+        keys = self._family_to_keys(family, limit)
+        slot = int(hashlib.md5(",".join(map(str, demand))).hexdigest(), 16)
+        key = keys[slot % limit]
+
+        solutions = self._get_local_solutions(family, limit)
+        if solutions is not None:
+            solutions[key] = (demand, shifts)
+            self.local.set(self._family_to_key(family, limit), solutions)
+        self._set_backend(key, (demand, shifts))
+
+    def disconnect(self):
+        """Drop backend connections. They reconnect when next used."""
+        # Forked processes must do this so they do not share connections.
+        # Writes deferred before the fork are left to the parent.
+        self.backend.disconnect()
+        self._deferred = OrderedDict()
+        self._defer_depth = 0
 
     def flush(self):
         """Flush all caches. Mainly used for testing."""
         # Set to warning becuase this probably shouldn't happen in prod
         self.logger.warning("Cache flushed")
-        self.mc.flush_all()
+        self.local.clear()
+        self._deferred.clear()
+        self.backend.flush()
+
+    def _get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        # The local tier may have evicted a write the backend has not seen
+        if key in self._deferred:
+            return self._deferred[key]
+
+        value = self.backend.get(key)
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    def _set(self, key, value):
+        self.local.set(key, value)
+        self._set_backend(key, value)
+
+    def _set_backend(self, key, value):
+        if self._defer_depth:
+            self._deferred[key] = value
+        else:
+            self.backend.set(key, value)
+
+    def _encode_entry(self, subproblem, shifts):
+        """The key and value to store shifts for a subproblem under"""
+        if shifts is None or len(shifts) is 0:
+            raise Exception("Do not set an empty cache")
+
+        subproblem, mirrored = self._canonicalize(subproblem)
+        if mirrored:
+            shifts = self._mirror_shifts(shifts, subproblem)
+        return (self._subproblem_to_key(subproblem),
+                encode_shifts(shifts, self.config.CACHE_COMPRESS_BYTES))
+
+    def _canonicalize(self, subproblem):
+        """Return the subproblem to store, and whether its demand is mirrored
+
+        Reversing demand in time and reversing its shifts gives an equally
+        good answer, so a demand and its mirror share the entry of whichever
+        is lexicographically smaller.
+        """
+        demand = subproblem.get("demand")
+        if not self.config.MIRROR_CACHE_KEYS or not demand:
+            return subproblem, False
+
+        mirrored_demand = list(reversed(demand))
+        if mirrored_demand < list(demand):
+            return dict(subproblem, demand=mirrored_demand), True
+
+        return subproblem, False
+
+    @staticmethod
+    def _mirror_shifts(shifts, subproblem):
+        """Reverse shifts in time within a subproblem's demand"""
+        demand_length = len(subproblem["demand"])
+        return [
+            dict(
+                shift, start=demand_length - shift["start"] - shift["length"])
+            for shift in shifts
+        ]
+
+    def _get_local_solutions(self, family, limit):
+        """A family's solutions by key from the local tier, or None"""
+        return self.local.get(self._family_to_key(family, limit))
+
+    @classmethod
+    def _family_to_key(cls, family, limit):
+        """Key for all of a family's solutions in the local tier"""
+        return cls._subproblem_to_key(dict(family, solutions=limit))
+
+    @classmethod
+    def _family_to_keys(cls, family, limit):
+        """Keys for the solutions of a family, apart from subproblem keys"""
+        return [
+            cls._subproblem_to_key(dict(family, solution=slot))
+            for slot in range(limit)
+        ]
 
     @staticmethod
     def _subproblem_to_key(subproblem):
         """Convert a subproblem into a memcached key"""
-        # Cannot just use straight json because it has spaces,
-        # which memcache does not support. Hash is repeatable and 
-        # also make sure we stay under the memcache key length limit
-        return hashlib.sha256(
-            json.dumps(subproblem, sort_keys=True)).hexdigest()
+        # Memcached keys cannot have spaces and are limited in length, so
+        # keys are a hash. Subproblems only hold numbers and lists of
+        # numbers, which join into a repeatable string much faster than
+        # json. MD5 is plenty to tell them apart, and quicker than SHA-256.
+        parts = ["v%s" % KEY_VERSION]
+        for name in sorted(subproblem):
+            value = subproblem[name]
+            if isinstance(value, (list, tuple)):
+                value = ",".join(map(str, value))
+            parts.append("%s=%s" % (name, value))
+        return hashlib.md5(";".join(parts)).hexdigest()
@@ -0,0 +1,234 @@
+# Shared stores behind chomp.cache.Cache.
+#
+# A backend maps string keys to values with get, set, get_multi, set_multi,
+# disconnect and flush. CACHE_BACKEND in the config picks one.
+import logging
+import os
+import sqlite3
+import time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import memcache
+
+# The package logger, which chomp sets up after importing this module
+logger = logging.getLogger("chomp")
+
+
+class MemcachedBackend(object):
+    """Memcached, shared by every process that uses the same servers"""
+
+    def __init__(self, config):
+        self.mc = memcache.Client(config.MEMCACHED_CONFIG)
+
+    def get(self, key):
+        return self.mc.get(key)
+
+    def set(self, key, value):
+        self.mc.set(key, value)
+
+    def set_multi(self, values):
+        """Store a dict of keys and values in one round trip"""
+        self.mc.set_multi(values)
+
+    def get_multi(self, keys):
+        """Return a dict with the value of every key that was found"""
+        return self.mc.get_multi(keys)
+
+    def disconnect(self):
+        self.mc.disconnect_all()
+
+    def flush(self):
+        self.mc.flush_all()
+
+
+class SqliteBackend(object):
+    """SQLite database on disk, which survives restarts
+
+    The database uses write ahead logging, so readers do not wait for
+    writers and several processes can share it. Each process opens its own
+    connection. Once entries take more than SQLITE_CACHE_BYTES, the least
+    recently used are evicted down to SQLITE_CACHE_EVICT_TO of that.
+
+    Once connected, reads do not wait for the write lock. An entry's use is
+    only recorded for eviction every SQLITE_CACHE_TOUCH_SECONDS, when the
+    lock is free or at the next write. As with memcached, errors never reach
+    callers: a database that stays locked, or cannot be opened, counts as a
+    miss, and writes that fail (e.g. on a full disk) are logged and dropped.
+    """
+
+    # Most keys in one query, below SQLite's limit on parameters
+    QUERY_KEYS = 500
+
+    # Seconds that writers wait for each other
+    TIMEOUT = 30
+
+    def __init__(self, config):
+        self.path = config.SQLITE_CACHE_PATH
+        self.max_bytes = config.SQLITE_CACHE_BYTES
+        self.evict_to_bytes = int(config.SQLITE_CACHE_BYTES *
+                                  config.SQLITE_CACHE_EVICT_TO)
+        self.touch_seconds = config.SQLITE_CACHE_TOUCH_SECONDS
+        self._touched = set()  # Keys read but not yet marked as used
+        self._connection = None
+        self._pid = None
+
+    def get(self, key):
+        return self.get_multi([key]).get(key)
+
+    def set(self, key, value):
+        self.set_multi({key: value})
+
+    def set_multi(self, values):
+        """Store a dict of keys and values in one transaction"""
+        now = time.time()
+        rows = [(key,
+                 sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)),
+                 now) for key, value in values.items()]
+
+        try:
+            connection = self._connect()
+            with connection:
+                # Take the write lock first so the size total stays consistent
+                connection.execute("BEGIN IMMEDIATE")
+                added = 0
+                for key, data, used_at in rows:
+                    previous = connection.execute(
+                        "SELECT size FROM entries WHERE key = ?",
+                        (key, )).fetchone()
+                    connection.execute(
+                        "INSERT OR REPLACE INTO entries "
+                        "(key, value, size, used_at) VALUES (?, ?, ?, ?)",
+                        (key, data, len(data), used_at))
+                    added += len(data) - (previous[0] if previous else 0)
+                connection.execute("UPDATE totals SET size = size + ?",
+                                   (added, ))
+                self._record_touched(connection)
+                self._evict(connection)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Dropped %s SQLite cache writes: %s", len(rows), e)
+
+    def get_multi(self, keys):
+        """Return a dict with the value of every key that was found"""
+        found = {}
+        stale_before = time.time() - self.touch_seconds
+        try:
+            connection = self._connect()
+            for i in range(0, len(keys), self.QUERY_KEYS):
+                chunk = list(keys[i:i + self.QUERY_KEYS])
+                rows = connection.execute(
+                    "SELECT key, value, used_at FROM entries WHERE key IN (%s)"
+                    % ",".join("?" * len(chunk)), chunk).fetchall()
+                for key, data, used_at in rows:
+                    found[key] = pickle.loads(bytes(data))
+                    # Eviction only needs a rough idea of recent use
+                    if used_at < stale_before:
+                        self._touched.add(key)
+        except (sqlite3.Error, OSError) as e:
+            # E.g. still locked after the timeout, so callers solve the
+            # problems
+            logger.warning("SQLite cache read failed: %s", e)
+            return {}
+
+        if self._touched:
+            self._try_record_touched(connection)
+        return found
+
+    def disconnect(self):
+        """Close this process's connection. It reopens when next used."""
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def flush(self):
+        try:
+            connection = self._connect()
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute("DELETE FROM entries")
+                connection.execute("UPDATE totals SET size = 0")
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("SQLite cache flush failed: %s", e)
+
+    def _connect(self):
+        """This process's connection, opened and set up when needed"""
+        # Connections cannot be shared with forked processes
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Another process may have just made it
+                if not os.path.isdir(directory):
+                    raise
+
+        # Transactions are begun explicitly, and writers wait for each other
+        connection = sqlite3.connect(
+            self.path, timeout=self.TIMEOUT, isolation_level=None)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, "
+                "value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "used_at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_used_at "
+                               "ON entries (used_at)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS totals (size INTEGER NOT NULL)")
+            if connection.execute("SELECT COUNT(*) FROM totals").fetchone()[
+                    0] == 0:
+                connection.execute("INSERT INTO totals (size) VALUES (0)")
+
+        self._connection = connection
+        self._pid = os.getpid()
+        return connection
+
+    def _try_record_touched(self, connection):
+        """Record reads now if the write lock is free, else at the next write"""
+        try:
+            connection.execute("PRAGMA busy_timeout = 0")
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                self._record_touched(connection)
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            connection.execute("PRAGMA busy_timeout = %d" %
+                               (self.TIMEOUT * 1000))
+
+    def _record_touched(self, connection):
+        """Mark entries that were read as used, within a write transaction"""
+        now = time.time()
+        connection.executemany("UPDATE entries SET used_at = ? WHERE key = ?",
+                               [(now, key) for key in self._touched])
+        self._touched.clear()
+
+    def _evict(self, connection):
+        """Delete least recently used entries while over the size limit"""
+        size = connection.execute("SELECT size FROM totals").fetchone()[0]
+        if size <= self.max_bytes:
+            return
+
+        evicted = []
+        for key, entry_size in connection.execute(
+                "SELECT key, size FROM entries ORDER BY used_at"):
+            if size <= self.evict_to_bytes:
+                break
+            evicted.append((key, ))
+            size -= entry_size
+
+        connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        connection.execute("UPDATE totals SET size = ?", (max(size, 0), ))
+
+
+CACHE_BACKENDS = {
+    "memcached": MemcachedBackend,
+    "sqlite": SqliteBackend,
+}
@@ -11,16 +11,130 @@ class DefaultConfig:
     # Logging - we use papertrail.com
     SYSLOG_SERVER = os.getenv("SYSLOG_SERVER")
     CALCULATION_TIMEOUT = 10 * 60  # 10 minutes, in seconds
+    # Hard limit for solving a whole schedule. It is shared out across windows
+    # and subproblems by size, and each search also stops at
+    # CALCULATION_TIMEOUT. Uploading shifts as they stream does not count.
+    TASK_TIMEOUT = 30 * 60  # 30 minutes, in seconds
+    DEADLINE_CHECK_INTERVAL = 256  # Branches between reading the clock
     BIFURCATION_THRESHHOLD = 100  # Sum of demand needed before splitting
 
+    # How Decompose solves a subproblem. "branch_and_bound" searches for
+    # shifts and may time out, while "min_cost_flow" solves exactly in
+    # polynomial time and never bifurcates.
+    DECOMPOSE_ENGINE = "branch_and_bound"
+
+    # How Decompose explores branches. "in_place" adds and rolls back shifts
+    # on a single collection, while "copy" deep copies it for every branch.
+    # Both are depth first. "best_first" always expands the branch with the
+    # lowest bound, which proves a tighter gap as it goes.
+    SEARCH_MODE = "in_place"
+
+    # Processes for the depth first search. With more than one, subtrees
+    # near the root are searched in parallel and share their incumbents.
+    # Problems with less total demand than PARALLEL_MIN_DEMAND are searched
+    # in one process, since starting workers would take longer. Workers are
+    # started once and kept for later searches.
+    THREADS = 1
+    PARALLEL_MIN_DEMAND = 40
+    PARALLEL_SUBTREES_PER_THREAD = 4  # More subtrees balance load better
+    PARALLEL_SYNC_INTERVAL = 64  # Branches between reading incumbents
+
+    # How Splitter breaks up 24/7 demand. "day" solves each day on its own,
+    # while "overlapping" solves shorter windows that start OVERLAP_WINDOW_STEP
+    # of a day apart and stitches them together without hard cuts. That is
+    # faster, and usually but not always has less overage.
+    ALWAYS_OPEN_WINDOWS = "day"
+    OVERLAP_WINDOW_STEP = 1 / 3.0
+
+    # Processes that solve Splitter windows at the same time. Each window is
+    # then solved with one process. 1 solves windows one after another, so
+    # streamed shifts are only uploaded while windows solve above 1.
+    WINDOW_PROCESSES = 1
+
+    # Stop searching once a solution is proven within this fraction of
+    # optimal (e.g. 0.01 for 1%). 0 searches until optimality is proven.
+    ACCEPTABLE_GAP = 0.0
+
+    # Bound used to prune branches before expanding them (see bounds.py).
+    # "min_length_run" adds the overage forced by the min shift length to
+    # "committed_overage", which only counts overage already scheduled.
+    LOWER_BOUND = "min_length_run"
+
+    # Most search states remembered so repeats can be pruned. 0 disables.
+    # Each takes about 330 bytes, so the default is under 7 MB per search
+    # process, and THREADS parallel workers each keep their own table.
+    TRANSPOSITION_TABLE_SIZE = 20000
+
+    # Search runs of constant demand as segments, so 15 minute demand is not
+    # much slower to solve than hourly. Shifts only end where demand changes,
+    # unless they are the min or max length, which still finds an optimal
+    # solution. When every run and both shift length limits are whole blocks
+    # (e.g. an hourly forecast with shifts of whole hours), each block is
+    # also merged into one time.
+    COMPRESS_DEMAND = False
+
+    # Construction heuristics run for the first solution of a search, in
+    # order, until HEURISTIC_TIMEOUT (see heuristics.py). The best one wins.
+    HEURISTICS = [
+        "min_length_fill", "longest_shift", "layer_peeling",
+        "layer_dynamic_program"
+    ]
+    HEURISTIC_TIMEOUT = 1  # Seconds
+
+    # Start searches from a cached solution of a similar demand when it beats
+    # the heuristic. Demands must cover this one everywhere or differ by at
+    # most WARM_START_DISTANCE of its sum. Up to WARM_START_SOLUTIONS are kept
+    # for each combination of shift lengths and demand length, and a new one
+    # replaces whichever has the same slot, picked by a hash of its demand.
+    # Off until it is shown to save more search than its cache reads and
+    # writes cost: on 30 similar demands it was about 10% slower.
+    WARM_START = False
+    WARM_START_SOLUTIONS = 20
+    WARM_START_DISTANCE = 0.25
+
+    # Collection used while searching. "numpy" stores demand and coverage as
+    # small integer arrays and scores every branch of a node at once. It
+    # requires numpy to be installed.
+    SHIFT_COLLECTION = "python"
+
+    # How coverage is counted for validation (see coverage.py). "numpy" sums
+    # shifts with array operations, which is faster on long horizons and
+    # requires numpy to be installed.
+    COVERAGE_KERNEL = "python"
+
     # Scheduling constants
     DAYS_OF_WEEK = [
         "monday", "tuesday", "wednesday", "thursday", "friday", "saturday",
         "sunday"
     ]
 
+    # Where cached subproblems are shared. "memcached" is lost on restart,
+    # while "sqlite" keeps them in a file on disk that every process on the
+    # machine uses. The file is kept to SQLITE_CACHE_BYTES of entries by
+    # evicting the least recently used down to SQLITE_CACHE_EVICT_TO of that.
+    # Reads only update when an entry was used if it was over
+    # SQLITE_CACHE_TOUCH_SECONDS ago, since that takes the write lock.
+    CACHE_BACKEND = "memcached"
     MEMCACHED_CONFIG = ['127.0.0.1:11211'
                         ]  # Localhost. May centralize in future.
+    SQLITE_CACHE_PATH = os.getenv("SQLITE_CACHE_PATH",
+                                  "/var/cache/chomp/cache.sqlite")
+    SQLITE_CACHE_BYTES = 256 * 1024 * 1024
+    SQLITE_CACHE_EVICT_TO = 0.9
+    SQLITE_CACHE_TOUCH_SECONDS = 60
+
+    # Share cached answers between demands that are the same backwards in
+    # time, like opening and closing ramps. Their shifts are mirrored.
+    MIRROR_CACHE_KEYS = True
+
+    # Cached shifts are packed into a compact binary format, and compressed
+    # when the packed shifts are longer than this many bytes.
+    CACHE_COMPRESS_BYTES = 256
+
+    # In-process cache in front of memcached. The least recently used
+    # entries are evicted beyond either limit. 0 entries disables it.
+    LOCAL_CACHE_ENTRIES = 10000
+    LOCAL_CACHE_BYTES = 32 * 1024 * 1024
 
     TASKING_FETCH_INTERVAL_SECONDS = 20
     STAFFJOY_API_KEY = os.environ.get("STAFFJOY_API_KEY")
@@ -47,6 +161,7 @@ class DevelopmentConfig(DefaultConfig):
     MAX_TUNING_TIME = 5 * 60  # 5 minutes
     THREADS = 2
     CALCULATION_TIMEOUT = 5 * 60  # 5 minutes, in seconds
+    TASK_TIMEOUT = 15 * 60  # 15 minutes, in seconds
     KILL_ON_ERROR = False
 
 
@@ -56,6 +171,7 @@ class TestConfig(DefaultConfig):
     LOG_LEVEL = logging.DEBUG
     THREADS = 6
     CALCULATION_TIMEOUT = 5 * 60  # 5 minutes, in seconds
+    TASK_TIMEOUT = 15 * 60  # 15 minutes, in seconds
     KILL_ON_ERROR = False
 
 
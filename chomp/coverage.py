@@ -0,0 +1,70 @@
+from chomp import config
+
+
+def get_coverage(shifts, demand_length, circular=False):
+    """Count how many (start, length) shifts cover each time
+
+    Shifts are marked where they start and end in a difference array, and a
+    running sum turns that into coverage, so the cost does not depend on
+    how long shifts are. Circular coverage wraps past the end of demand
+    back to the start, like a week that repeats. Otherwise shifts must lie
+    within demand.
+    """
+    # Every shift becomes one or two [start, end) ranges within demand.
+    # Circular shifts that go all the way around cover every time.
+    starts = []
+    ends = []
+    laps = 0
+    for start, length in shifts:
+        if circular:
+            shift_laps, length = divmod(length, demand_length)
+            laps += shift_laps
+            start %= demand_length
+        elif start < 0 or start + length > demand_length:
+            raise Exception(
+                "Shift lies outside demand bounds (demand length %s, shift start %s, shift end %s)"
+                % (demand_length, start, start + length))
+
+        end = start + length
+        if end > demand_length:
+            starts.extend([start, 0])
+            ends.extend([demand_length, end - demand_length])
+        else:
+            starts.append(start)
+            ends.append(end)
+
+    if config.COVERAGE_KERNEL == "numpy":
+        return _sum_ranges_with_numpy(starts, ends, demand_length, laps)
+
+    if config.COVERAGE_KERNEL != "python":
+        raise Exception("Unknown coverage kernel %s" % config.COVERAGE_KERNEL)
+
+    return _sum_ranges(starts, ends, demand_length, laps)
+
+
+def _sum_ranges(starts, ends, demand_length, base):
+    """Coverage of [start, end) ranges on top of a base level"""
+    difference = [0] * (demand_length + 1)
+    for start in starts:
+        difference[start] += 1
+    for end in ends:
+        difference[end] -= 1
+
+    coverage = []
+    running = base
+    for t in range(demand_length):
+        running += difference[t]
+        coverage.append(running)
+
+    return coverage
+
+
+def _sum_ranges_with_numpy(starts, ends, demand_length, base):
+    """Coverage of [start, end) ranges on top of a base level"""
+    # Imported here so numpy is only needed when it is used
+    import numpy
+
+    difference = numpy.zeros(demand_length + 1, dtype=numpy.int64)
+    numpy.add.at(difference, numpy.array(starts, dtype=numpy.intp), 1)
+    numpy.add.at(difference, numpy.array(ends, dtype=numpy.intp), -1)
+    return (numpy.cumsum(difference[:-1]) + base).tolist()
@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+try:
+    from time import monotonic
+except ImportError:
+    # Python 2 has no monotonic clock in the standard library
+    from monotonic import monotonic
+
+
+class Deadline(object):
+    """A point in time, on a monotonic clock, by which work must stop
+
+    The clock is shared by every process on the machine, so a deadline can
+    be handed to forked workers. Smaller budgets are carved out of it with
+    share() and cap(), and never outlast it.
+    """
+
+    def __init__(self, seconds, expires_at=None):
+        self.started_at = monotonic()
+        self.expires_at = self.started_at + seconds
+        if expires_at is not None and expires_at < self.expires_at:
+            self.expires_at = expires_at
+
+    def remaining(self):
+        """Seconds left, never negative"""
+        return max(self.expires_at - monotonic(), 0.0)
+
+    def elapsed(self):
+        """Seconds since this budget was handed out"""
+        return monotonic() - self.started_at
+
+    def expired(self):
+        return monotonic() >= self.expires_at
+
+    def share(self, fraction):
+        """A budget for a fraction of the time that is left"""
+        return Deadline(
+            self.remaining() * min(fraction, 1.0), expires_at=self.expires_at)
+
+    def cap(self, seconds):
+        """A budget of at most seconds that still ends by this deadline"""
+        return Deadline(seconds, expires_at=self.expires_at)
+
+    @contextmanager
+    def paused(self):
+        """Push the deadline back by the time spent in the block
+
+        Budgets already carved out of it keep their own end.
+        """
+        paused_at = monotonic()
+        try:
+            yield
+        finally:
+            self.expires_at += monotonic() - paused_at
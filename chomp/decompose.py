@@ -1,23 +1,67 @@
+import heapq
 import math
+import os
+from fractions import gcd
+import multiprocessing
 import copy
 from copy import deepcopy
-from datetime import datetime, timedelta
+from collections import OrderedDict
 
 from chomp import logger, cache, config
+from chomp.bounds import LOWER_BOUNDS
+from chomp.coverage import get_coverage
+from chomp.deadline import Deadline
+from chomp.heuristics import HEURISTICS
 from chomp.helpers import reverse_inclusive_range
+from chomp.min_cost_flow import decompose_with_min_cost_flow
 from chomp.shift_collection import ShiftCollection
+from chomp.transposition_table import TranspositionTable
+from chomp.warm_start import find_warm_start, record_warm_start
 
 
 class Decompose:
     """Class for decomposing demand into shifts"""
 
-    def __init__(self, demand, min_length, max_length, window_offset=0):
+    def __init__(self,
+                 demand,
+                 min_length,
+                 max_length,
+                 window_offset=0,
+                 deadline=None):
         self.demand = demand  # Set this raw value for testing purposes
         self.min_length = min_length
         self.max_length = max_length
         self.window_offset = window_offset
+
+        # Time budget for the whole problem, including any subproblems.
+        # Defaults to TASK_TIMEOUT from when calculate() is called.
+        self.deadline = deadline
+
+        # Each unit of processed demand stands for this many units of the
+        # original demand (see _compress_demand)
+        self.compression = 1
         self._process_demand()  # This is the demand used for calculations
 
+        # Anytime search: stop once a solution is proven within this
+        # fraction of optimal, and call on_incumbent(shifts, gap) whenever
+        # a better solution is found. Both can be passed to calculate().
+        self.acceptable_gap = config.ACCEPTABLE_GAP
+        self.on_incumbent = None
+
+        # Whether the search stopped within the acceptable gap instead of
+        # proving its solution optimal. Such solutions are not cached, since
+        # the cache key does not include the gap.
+        self.stopped_on_gap = False
+
+        # Whether the deadline or CALCULATION_TIMEOUT stopped the search
+        # before it finished. Such solutions are not cached either, since a
+        # search with more time may do better.
+        self.stopped_early = False
+
+        # Name of the heuristic that gave the search its first solution, or
+        # "warm_start". Benchmarks use it to compare heuristics.
+        self.starting_heuristic = None
+
         # Preface with underscore bc this should never be accessed directly
         # - instead use  get_shifts() to apply offset
         self._shifts = []
@@ -56,12 +100,60 @@ class Decompose:
             elif demand[t] < peak:
                 demand[t] = peak
 
+        # 3) Merge times that always change together, and only branch where
+        # demand changes. This comes after smoothing, which is measured in
+        # times, so compressed demand is searched exactly like the original.
+        self._change_points = None
+        if config.COMPRESS_DEMAND:
+            demand = self._compress_demand(demand)
+            self._change_points = self._find_change_points(demand)
+
         self.demand = demand
         self.window_offset += offset
 
         logger.debug("Windowing removed %s leading zeros", offset)
         logger.debug("Processed demand: %s", self.demand)
 
+    def _compress_demand(self, demand):
+        """Shrink demand that is constant over blocks of the same size
+
+        When every run of constant demand and both shift length limits are
+        multiples of a block size, each block can be treated as one time.
+        Search then only branches where demand can change, and shifts are
+        stretched back out by get_shifts().
+        """
+        factor = gcd(self.min_length, self.max_length)
+        run_length = 1
+        for t in range(1, len(demand)):
+            if demand[t] == demand[t - 1]:
+                run_length += 1
+            else:
+                factor = gcd(factor, run_length)
+                run_length = 1
+        factor = gcd(factor, run_length)
+
+        if factor <= 1:
+            return demand
+
+        logger.debug("Compressed demand by a factor of %s", factor)
+        self.compression = factor
+        self.min_length //= factor
+        self.max_length //= factor
+        return demand[::factor]
+
+    @staticmethod
+    def _find_change_points(demand):
+        """Times where a new run of constant demand starts, and the end
+
+        Within a run, a shift that ends before the run does is either only
+        overage at its last time, or can trade that time with a shift that
+        starts there. So unless shift length limits stop it, some optimal
+        solution only ends shifts at change points.
+        """
+        return set([len(demand)] + [
+            t for t in range(1, len(demand)) if demand[t] != demand[t - 1]
+        ])
+
     def _split_demand(self, round_up=True):
         """Return unprocessed demand in half for subproblems"""
         halfsies = []
@@ -81,23 +173,22 @@ class Decompose:
 
     def get_shifts(self):
         """Return de-windowed shifts"""
-        shifts = copy.copy(self._shifts)
-        for shift in shifts:
-            shift["start"] += self.window_offset
-
-        return shifts
+        return [{
+            "start":
+            shift["start"] * self.compression + self.window_offset,
+            "length":
+            shift["length"] * self.compression,
+        } for shift in self._shifts]
 
     def validate(self):
         """Check whether shifts meet demand. Used in testing."""
-        expected_demand = [0] * len(self.demand)
-        sum_demand = copy.copy(expected_demand)
+        expected_demand = self.demand
 
         logger.debug("Starting validation of %s shifts", len(self._shifts))
 
-        for shift in self._shifts:
-            for t in range(shift["start"], shift["start"] + shift["length"]):
-                # Remove window
-                sum_demand[t] += 1
+        sum_demand = get_coverage([(shift["start"], shift["length"])
+                                   for shift in self._shifts],
+                                  len(self.demand))
 
         logger.debug("Expected demand: %s", expected_demand)
         logger.debug("Scheduled supply: %s", sum_demand)
@@ -119,73 +210,662 @@ class Decompose:
 
         return efficiency
 
+    def _get_cache_subproblem(self):
+        """The inputs that identify this problem in the cache"""
+        return {
+            "demand": self.demand,
+            "min_length": self.min_length,
+            "max_length": self.max_length,
+        }
+
+    def _get_cache(self):
+        return cache.get(**self._get_cache_subproblem())
+
     def _set_cache(self):
-        cache.set(
-            demand=self.demand,
-            min_length=self.min_length,
-            max_length=self.max_length,
-            shifts=self._shifts)
+        if self.stopped_on_gap or self.stopped_early:
+            return
+
+        cache.set(shifts=self._shifts, **self._get_cache_subproblem())
 
-    def calculate(self):
+    def calculate(self,
+                  acceptable_gap=None,
+                  on_incumbent=None,
+                  check_cache=True):
         if len(self._shifts) > 0:
             raise Exception("Shifts already calculated")
 
+        if acceptable_gap is not None:
+            self.acceptable_gap = acceptable_gap
+        if on_incumbent is not None:
+            # Only called for problems that are searched directly, since
+            # split subproblems have their own demand
+            self.on_incumbent = on_incumbent
+        if self.deadline is None:
+            self.deadline = Deadline(config.TASK_TIMEOUT)
+
         # Try checking cache. Putting the check here means it even works for
-        # subproblems!
-        cached_shifts = cache.get(
-            demand=self.demand,
-            min_length=self.min_length,
-            max_length=self.max_length)
-        if cached_shifts:
-            logger.info("Hit cache")
-            self._shifts = cached_shifts
-            return
+        # subproblems! Callers that already looked it up can skip this.
+        if check_cache:
+            cached_shifts = self._get_cache()
+            if cached_shifts:
+                logger.info("Hit cache")
+                self._shifts = cached_shifts
+                return
 
-        # Subproblem splitting
+        # Subproblem splitting. Min cost flow solves large demand exactly in
+        # polynomial time, so splitting would only lose optimality there.
         demand_sum = sum(self.demand)
-        if demand_sum > config.BIFURCATION_THRESHHOLD:
+        if (demand_sum > config.BIFURCATION_THRESHHOLD and
+                config.DECOMPOSE_ENGINE != "min_cost_flow"):
             # Subproblems. Split into round up and round down.
             logger.info("Initiating split (demand sum %s, threshhold %s)",
                         demand_sum, config.BIFURCATION_THRESHHOLD)
-            # Show parent demand sum becuase it can recursively split
-            demand_up = self._split_demand(round_up=True)
-            demand_low = self._split_demand(round_up=False)
-
-            d_up = Decompose(demand_up, self.min_length, self.max_length)
-            d_low = Decompose(demand_low, self.min_length, self.max_length)
-
-            logger.info(
-                "Beginning upper round subproblem (parent demand sum: %s)",
-                demand_sum)
-            d_up.calculate()
-
-            logger.info(
-                "Beginning lower round subproblem (parent demand sum: %s)",
-                demand_sum)
-            d_low.calculate()
-
-            self._shifts.extend(d_up.get_shifts())
-            self._shifts.extend(d_low.get_shifts())
+            self._calculate_split()
             self._set_cache()  # Set cache for the parent problem too!
             return
 
         self._calculate()
         self._set_cache()
 
+    def _calculate_split(self):
+        """Split into round up and round down subproblems until small enough
+
+        The whole tree is planned up front. Identical leaves (e.g. when every
+        demand value is even) are solved once, in parallel when THREADS is
+        above 1, and their shifts are repeated for every occurrence.
+        """
+        problems = [self]
+        subproblems = {}
+        leaves = []
+        index = 0
+        while index < len(problems):
+            problem = problems[index]
+            index += 1
+
+            if problem is not self:
+                cached_shifts = problem._get_cache()
+                if cached_shifts:
+                    logger.info("Hit cache")
+                    problem._shifts = cached_shifts
+                    continue
+
+                if sum(problem.demand) <= config.BIFURCATION_THRESHHOLD:
+                    leaves.append(problem)
+                    continue
+
+            # Lengths are in units of the problem's (maybe compressed) demand
+            children = (Decompose(
+                problem._split_demand(round_up=True),
+                problem.min_length,
+                problem.max_length), Decompose(
+                    problem._split_demand(round_up=False),
+                    problem.min_length,
+                    problem.max_length), )
+            for child in children:
+                child.acceptable_gap = self.acceptable_gap
+            subproblems[id(problem)] = children
+            problems.extend(children)
+
+        # Collapse identical leaves. Shifts are relative to the processed
+        # demand, so each copy only differs in its window offset.
+        distinct = OrderedDict()
+        for leaf in leaves:
+            key = (leaf.compression, tuple(leaf.demand))
+            distinct.setdefault(key, []).append(leaf)
+
+        logger.info("Solving %s distinct subproblems for %s leaves",
+                    len(distinct), len(leaves))
+        representatives = [copies[0] for copies in distinct.values()]
+
+        # Our time budget is shared out by the size of each leaf
+        sizes = [sum(leaf.demand) for leaf in representatives]
+        if config.THREADS > 1 and len(representatives) > 1:
+            # Leaves run THREADS at a time
+            total_size = float(sum(sizes))
+            for leaf, size in zip(representatives, sizes):
+                leaf.deadline = self.deadline.share(config.THREADS * size /
+                                                    total_size)
+
+            pool = multiprocessing.Pool(
+                config.THREADS, initializer=init_worker_process)
+            try:
+                solutions = pool.map(_solve_subproblem, representatives)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            solutions = []
+            remaining_size = sum(sizes)
+            for leaf, size in zip(representatives, sizes):
+                # Time that earlier leaves did not use goes to later ones
+                leaf.deadline = self.deadline.share(size /
+                                                    float(remaining_size))
+                remaining_size -= size
+                solutions.append(_solve_subproblem(leaf))
+
+        for copies, (shifts, stopped_on_gap, stopped_early) in zip(
+                distinct.values(), solutions):
+            for leaf in copies:
+                leaf._shifts = [dict(shift) for shift in shifts]
+                leaf.stopped_on_gap = stopped_on_gap
+                leaf.stopped_early = stopped_early
+
+        # Combine from the bottom of the tree up
+        for problem in reversed(problems):
+            children = subproblems.get(id(problem))
+            if children is None:
+                continue
+
+            for child in children:
+                problem._shifts.extend(child.get_shifts())
+                if child.stopped_on_gap:
+                    problem.stopped_on_gap = True
+                if child.stopped_early:
+                    problem.stopped_early = True
+            if problem is not self:
+                problem._set_cache()
+
     def _calculate(self):
         """Search that tree"""
+        if config.DECOMPOSE_ENGINE == "min_cost_flow":
+            return self._calculate_min_cost_flow()
+
+        if config.DECOMPOSE_ENGINE != "branch_and_bound":
+            raise Exception("Unknown decompose engine %s" %
+                            config.DECOMPOSE_ENGINE)
+
+        if config.SEARCH_MODE == "copy":
+            return self._calculate_with_copies()
+
+        if config.SEARCH_MODE == "best_first":
+            return self._calculate_best_first()
+
+        if config.SEARCH_MODE != "in_place":
+            raise Exception("Unknown search mode %s" % config.SEARCH_MODE)
+
+        return self._calculate_in_place()
+
+    def _calculate_min_cost_flow(self):
+        """Solve exactly as a min cost flow instead of searching"""
+        logger.info("Demand: %s", self.demand)
+        shifts = decompose_with_min_cost_flow(self.demand, self.min_length,
+                                              self.max_length)
+        self.set_shift_collection_as_optimal(
+            self._new_collection(shifts=shifts))
+
+    def _calculate_in_place(self):
+        """Search that tree on one collection, rolling back to backtrack"""
+        # Explores branches in exactly the same order as
+        # _calculate_with_copies, so it returns the same shifts.
+
+        starting_solution, best_known_coverage = self._get_starting_solution()
+
+        # Helper variables for branch and bound
+        best_known_shifts = list(starting_solution.shifts)
+
+        logger.debug("Starting with known coverage %s vs best possible %s",
+                     starting_solution.coverage_sum, sum(self.demand))
+
+        logger.info("Demand: %s", self.demand)
+        collection = self._new_collection()
+
+        # Depth first search only proves the bound at the root
+        root_bound = self._lower_bound(collection)
+        if self._report_incumbent(best_known_shifts,
+                                  starting_solution.coverage_sum, root_bound):
+            self._stop_on_gap()
+        else:
+            deadline = self._search_deadline()
+            # Starting workers costs more than searching small problems
+            if (config.THREADS > 1 and
+                    sum(self.demand) >= config.PARALLEL_MIN_DEMAND):
+                search = self._search_in_parallel
+            else:
+                search = self._search_subtree
+
+            best_known_coverage, best_known_shifts = search(
+                collection, best_known_coverage, best_known_shifts, root_bound,
+                deadline)
+
+        self.set_shift_collection_as_optimal(
+            self._new_collection(shifts=best_known_shifts))
+
+    def _search_subtree(self,
+                        collection,
+                        best_known_coverage,
+                        best_known_shifts,
+                        root_bound,
+                        deadline,
+                        get_shared_limit=None,
+                        on_improvement=None):
+        """Depth first search below the collection's current shifts
+
+        Returns the best coverage and shifts found. get_shared_limit and
+        on_improvement let parallel workers exchange incumbents.
+        """
+        best_possible_solution = sum(self.demand)
+
+        # Branches to search are (depth, shift length) pairs. A branch is
+        # rebuilt by rolling back to its parent's depth and adding its shift.
+        stack = [(collection.depth, None)]
+
+        # States already reached through another order of shifts
+        transpositions = TranspositionTable(config.TRANSPOSITION_TABLE_SIZE)
+
+        shared_limit = None
+        branch_count = 0
+
+        while len(stack) != 0:
+            if self._is_out_of_time(deadline, branch_count):
+                break
+
+            if (get_shared_limit is not None and
+                    branch_count % config.PARALLEL_SYNC_INTERVAL == 0):
+                shared_limit = get_shared_limit()
+            branch_count += 1
+
+            # Prune against our own incumbent and any shared one
+            limit = best_known_coverage
+            if shared_limit is not None and shared_limit < limit:
+                limit = shared_limit
+
+            # Get a branch
+            depth, length = stack.pop()
+            if length is not None:
+                while collection.depth >= depth:
+                    collection.rollback()
+                self._add_branch_shift(collection, length)
+
+            if collection.is_optimal:
+                # We have a complete solution
+                logger.info("Found an optimal collection. Exiting.")
+                self._report_incumbent(collection.shifts,
+                                       collection.coverage_sum,
+                                       collection.coverage_sum)
+                if on_improvement is not None:
+                    on_improvement(collection.coverage_sum)
+                return collection.coverage_sum, list(collection.shifts)
+
+            if collection.demand_is_met:
+                if collection.coverage_sum < best_known_coverage:
+                    logger.info(
+                        "Better solution found (previous coverage %s / new coverage %s / best_possible %s)",
+                        best_known_coverage, collection.coverage_sum,
+                        best_possible_solution)
+
+                    # Set new best possible solution
+                    best_known_shifts = list(collection.shifts)
+                    best_known_coverage = collection.coverage_sum
+                    if on_improvement is not None:
+                        on_improvement(best_known_coverage)
+
+                    if self._report_incumbent(best_known_shifts,
+                                              best_known_coverage, root_bound):
+                        self._stop_on_gap()
+                        break
+                else:
+                    logger.debug("Found less optimal solution - continuing")
+
+            elif (self._lower_bound(collection) < limit and
+                  not transpositions.is_dominated(collection.get_state_key(),
+                                                  collection.coverage_sum)):
+                # Gotta add more shifts!
+                start = collection.get_first_time_demand_not_met()
+
+                lengths = self._get_branch_lengths(start)
+                scores = collection.score_shifts(start, lengths)
+
+                for length, coverage in zip(lengths, scores):
+                    if coverage < limit:
+                        # Only save it if it's an improvement
+                        stack.append((depth + 1, length))
+
+        logger.debug("Transposition table pruned %s branches",
+                     transpositions.hits)
+        return best_known_coverage, best_known_shifts
+
+    def _search_in_parallel(self, collection, best_known_coverage,
+                            best_known_shifts, root_bound, deadline):
+        """Farm subtrees near the root out to a pool of worker processes"""
+        # Subtrees are listed in the order the serial search visits them.
+        # Each worker prunes with the incumbents of earlier subtrees, but
+        # keeps ties with later ones, so the earliest of the best solutions
+        # wins exactly as in the serial search.
+        paths = self._split_subtrees(collection, best_known_coverage,
+                                     config.THREADS *
+                                     config.PARALLEL_SUBTREES_PER_THREAD)
+        if len(paths) < 2:
+            return self._search_subtree(collection, best_known_coverage,
+                                        best_known_shifts, root_bound,
+                                        deadline)
+
+        logger.info("Searching %s subtrees with %s processes",
+                    len(paths), config.THREADS)
+
+        pool, incumbents = _get_search_pool(len(paths))
+        for index in range(len(paths)):
+            incumbents[index] = best_known_coverage
+
+        # Incumbents are reported by the parent as results come back
+        searcher = copy.copy(self)
+        searcher.on_incumbent = None
+        tasks = [(searcher, index, len(paths), path, best_known_coverage,
+                  best_known_shifts, root_bound, deadline)
+                 for index, path in enumerate(paths)]
+
+        results = {}
+        reported_coverage = best_known_coverage
+        finished = False
+        try:
+            for (index, coverage, shifts, stopped_on_gap,
+                 stopped_early) in pool.imap_unordered(
+                     _search_parallel_subtree, tasks):
+                results[index] = (coverage, shifts)
+                if stopped_on_gap:
+                    self.stopped_on_gap = True
+                if stopped_early:
+                    self.stopped_early = True
+                if coverage < reported_coverage:
+                    reported_coverage = coverage
+                    if self._report_incumbent(shifts, coverage, root_bound):
+                        self._stop_on_gap()
+                        break
+            else:
+                finished = True
+        finally:
+            if not finished:
+                # Workers may still be searching and writing incumbents
+                _close_search_pool()
+
+        # Keep the earliest subtree among the best, like the serial search
+        for index in sorted(results):
+            coverage, shifts = results[index]
+            if coverage < best_known_coverage:
+                best_known_coverage = coverage
+                best_known_shifts = shifts
+
+        return best_known_coverage, best_known_shifts
+
+    def _split_subtrees(self, collection, best_known_coverage, target):
+        """List branch paths near the root in depth first search order"""
+        # Expand level by level until there are enough subtrees. Replacing
+        # each branch with its children in place keeps the search order.
+        paths = [()]
+        path = ()
+        expanded = True
+        while expanded and len(paths) < target:
+            expanded = False
+            next_paths = []
+            for branch_path in paths:
+                path = self._move_to_path(collection, path, branch_path)
+                if collection.demand_is_met:
+                    next_paths.append(branch_path)
+                    continue
+
+                if self._lower_bound(collection) >= best_known_coverage:
+                    continue
+
+                start = collection.get_first_time_demand_not_met()
+                lengths = self._get_branch_lengths(start)[::-1]
+                scores = collection.score_shifts(start, lengths)
+                for length, coverage in zip(lengths, scores):
+                    if coverage < best_known_coverage:
+                        next_paths.append(branch_path + (length, ))
+                expanded = True
+
+            paths = next_paths
+
+        self._move_to_path(collection, path, ())
+        return paths
+
+    def _calculate_best_first(self):
+        """Search that tree, always expanding the branch with the best bound"""
+        # The smallest bound left in the heap is a proven lower bound for the
+        # whole problem, so the gap to the incumbent shrinks as we go.
+
+        starting_solution, best_known_coverage = self._get_starting_solution()
+        best_known_shifts = list(starting_solution.shifts)
+
+        logger.info("Demand: %s", self.demand)
+        collection = self._new_collection()
+        transpositions = TranspositionTable(config.TRANSPOSITION_TABLE_SIZE)
+
+        # Branches are (bound, -depth, order, path, bound is final). Ties go
+        # to deeper branches, which are closer to a solution. A branch is
+        # first queued with the cheap bound from score_shifts and re-queued
+        # once the configured bound has been computed.
+        order = 0
+        heap = [(collection.best_possible_coverage, 0, order, (), False)]
+        path = ()
+
+        lower_bound = collection.best_possible_coverage
+        if self._report_incumbent(best_known_shifts,
+                                  starting_solution.coverage_sum, lower_bound):
+            self._stop_on_gap()
+            heap = []
+
+        deadline = self._search_deadline()
+        branch_count = 0
+
+        while len(heap) != 0:
+            if self._is_out_of_time(deadline, branch_count):
+                break
+            branch_count += 1
+
+            bound, _, _, branch_path, bound_is_final = heapq.heappop(heap)
+            if bound >= best_known_coverage:
+                # Nothing left can beat the incumbent
+                lower_bound = best_known_coverage
+                break
+
+            if bound > lower_bound:
+                lower_bound = bound
+                if self._gap_is_acceptable(best_known_coverage, lower_bound):
+                    self._stop_on_gap()
+                    break
+
+            path = self._move_to_path(collection, path, branch_path)
+
+            if collection.is_optimal:
+                logger.info("Found an optimal collection. Exiting.")
+                self._report_incumbent(collection.shifts,
+                                       collection.coverage_sum,
+                                       collection.coverage_sum)
+                self.set_shift_collection_as_optimal(collection)
+                return
+
+            if collection.demand_is_met:
+                if collection.coverage_sum < best_known_coverage:
+                    logger.info(
+                        "Better solution found (previous coverage %s / new coverage %s / lower bound %s)",
+                        best_known_coverage, collection.coverage_sum,
+                        lower_bound)
+                    best_known_shifts = list(collection.shifts)
+                    best_known_coverage = collection.coverage_sum
+
+                    if self._report_incumbent(best_known_shifts,
+                                              best_known_coverage,
+                                              lower_bound):
+                        self._stop_on_gap()
+                        break
+                continue
+
+            if not bound_is_final:
+                full_bound = self._lower_bound(collection)
+                if full_bound >= best_known_coverage:
+                    continue
+                if full_bound > bound:
+                    order += 1
+                    heapq.heappush(heap, (full_bound, -len(path), order, path,
+                                          True))
+                    continue
+
+            if transpositions.is_dominated(collection.get_state_key(),
+                                           collection.coverage_sum):
+                continue
+
+            start = collection.get_first_time_demand_not_met()
+            lengths = self._get_branch_lengths(start)
+            scores = collection.score_shifts(start, lengths)
+
+            for length, coverage in zip(lengths, scores):
+                if coverage < best_known_coverage:
+                    order += 1
+                    heapq.heappush(heap, (coverage, -(len(path) + 1), order,
+                                          path + (length, ), False))
+
+        logger.info(
+            "Best first search finished with coverage %s (lower bound %s)",
+            best_known_coverage, lower_bound)
+        self.set_shift_collection_as_optimal(
+            self._new_collection(shifts=best_known_shifts))
+
+    def _search_deadline(self):
+        """Budget for one search, which also ends with the whole problem's"""
+        if self.deadline is None:
+            return Deadline(config.CALCULATION_TIMEOUT)
+
+        return self.deadline.cap(config.CALCULATION_TIMEOUT)
+
+    def _is_out_of_time(self, deadline, branch_count):
+        """Cheaply check the deadline every DEADLINE_CHECK_INTERVAL branches"""
+        if branch_count % config.DEADLINE_CHECK_INTERVAL != 0:
+            return False
+
+        if not deadline.expired():
+            return False
+
+        logger.info("Exited due to timeout (%s seconds)", deadline.elapsed())
+        self.stopped_early = True
+        return True
+
+    def _report_incumbent(self, shifts, coverage, lower_bound):
+        """Share an improved solution and return whether it is good enough"""
+        gap = self._relative_gap(coverage, lower_bound)
+        logger.info("Incumbent coverage %s is within %s percent of optimal",
+                    coverage, gap * 100.0)
+
+        if self.on_incumbent is not None:
+            self.on_incumbent([{
+                "start":
+                start * self.compression + self.window_offset,
+                "length":
+                length * self.compression,
+            } for start, length in shifts], gap)
+
+        return self._gap_is_acceptable(coverage, lower_bound)
+
+    def _gap_is_acceptable(self, coverage, lower_bound):
+        """Whether the configured gap lets us stop with this solution"""
+        # With no gap we keep searching, which preserves the preference for
+        # long shifts among optimal solutions
+        if self.acceptable_gap <= 0:
+            return False
+
+        return self._relative_gap(coverage, lower_bound) <= self.acceptable_gap
+
+    def _stop_on_gap(self):
+        """Note that the search ends without proving optimality"""
+        logger.info("Solution within acceptable gap. Exiting.")
+        self.stopped_on_gap = True
+
+    @staticmethod
+    def _relative_gap(coverage, lower_bound):
+        """Fraction of a solution's coverage that may be above optimal"""
+        if coverage <= 0:
+            return 0.0
+
+        return max(coverage - lower_bound, 0) / float(coverage)
+
+    @staticmethod
+    def _lower_bound(collection):
+        """Bound the coverage of any solution reachable from a collection"""
+        if config.LOWER_BOUND not in LOWER_BOUNDS:
+            raise Exception("Unknown lower bound %s" % config.LOWER_BOUND)
+
+        return LOWER_BOUNDS[config.LOWER_BOUND](collection)
+
+    def _new_collection(self, shifts=None):
+        """Build an empty collection of the configured type for our demand"""
+        if config.SHIFT_COLLECTION == "numpy":
+            # Imported here so numpy is only needed when it is used
+            from chomp.numpy_shift_collection import NumpyShiftCollection
+            collection_class = NumpyShiftCollection
+        elif config.SHIFT_COLLECTION == "python":
+            collection_class = ShiftCollection
+        else:
+            raise Exception("Unknown shift collection %s" %
+                            config.SHIFT_COLLECTION)
+
+        return collection_class(
+            self.min_length,
+            self.max_length,
+            demand=self.demand,
+            shifts=shifts)
+
+    @classmethod
+    def _move_to_path(cls, collection, path, new_path):
+        """Move a collection from one branch to another, returning new_path
+
+        Paths are the shift lengths added from the root. Only the shifts
+        after the common prefix are rolled back and added again.
+        """
+        shared = 0
+        while (shared < len(path) and shared < len(new_path) and
+               path[shared] == new_path[shared]):
+            shared += 1
+
+        while collection.depth > shared:
+            collection.rollback()
+        for length in new_path[shared:]:
+            cls._add_branch_shift(collection, length)
+
+        return new_path
+
+    def _get_branch_lengths(self, start):
+        """Lengths of the shifts to try at a start time, longest first
+
+        With COMPRESS_DEMAND, shifts of other than the min or max length
+        must end at a change point (see _find_change_points).
+        """
+        # Our edge smoothing means this will always work
+        lengths = [
+            length
+            for length in reverse_inclusive_range(self.min_length,
+                                                  self.max_length)
+            if start + length <= len(self.demand)
+        ]
+        if self._change_points is None:
+            return lengths
+
+        return [
+            length for length in lengths
+            if (length == self.min_length or length == self.max_length or start
+                + length in self._change_points)
+        ]
+
+    @staticmethod
+    def _add_branch_shift(collection, length):
+        """Open a checkpoint and add a shift at the first unmet time"""
+        start = collection.get_first_time_demand_not_met()
+        collection.checkpoint()
+        collection.add_shift((start, length))
+        if collection.demand_is_met:
+            collection.anneal()
+
+    def _calculate_with_copies(self):
+        """Search that tree, copying the collection for every branch"""
         # Not only do we want optimality, but we want it with
         # longest shifts possible. That's why we do DFS on long shifts.
 
-        starting_solution = self.use_heuristics_to_generate_some_solution()
+        starting_solution, best_known_coverage = self._get_starting_solution()
 
         # Helper variables for branch and bound
-        best_known_coverage = starting_solution.coverage_sum
         best_known_solution = starting_solution
         best_possible_solution = sum(self.demand)
 
         logger.debug("Starting with known coverage %s vs best possible %s",
-                     best_known_coverage, best_possible_solution)
+                     starting_solution.coverage_sum, best_possible_solution)
 
         # Branches to search
         # (We want shortest shifts retrieved first, so 
@@ -195,19 +875,27 @@ class Decompose:
 
         stack = []
 
+        # States already reached through another order of shifts
+        transpositions = TranspositionTable(config.TRANSPOSITION_TABLE_SIZE)
+
         logger.info("Demand: %s", self.demand)
-        empty_collection = ShiftCollection(
-            self.min_length, self.max_length, demand=self.demand)
+        empty_collection = self._new_collection()
         stack.append(empty_collection)
 
-        start_time = datetime.utcnow()
+        # Depth first search only proves the bound at the root
+        root_bound = self._lower_bound(empty_collection)
+        if self._report_incumbent(best_known_solution.shifts,
+                                  starting_solution.coverage_sum, root_bound):
+            self._stop_on_gap()
+            stack = []
+
+        deadline = self._search_deadline()
+        branch_count = 0
 
         while len(stack) != 0:
-            if start_time + timedelta(
-                    seconds=config.CALCULATION_TIMEOUT) < datetime.utcnow():
-                logger.info("Exited due to timeout (%s seconds)",
-                            (datetime.utcnow() - start_time).total_seconds())
+            if self._is_out_of_time(deadline, branch_count):
                 break
+            branch_count += 1
 
             # Get a branch
             working_collection = stack.pop()
@@ -215,6 +903,9 @@ class Decompose:
             if working_collection.is_optimal:
                 # We have a complete solution
                 logger.info("Found an optimal collection. Exiting.")
+                self._report_incumbent(working_collection.shifts,
+                                       working_collection.coverage_sum,
+                                       working_collection.coverage_sum)
                 self.set_shift_collection_as_optimal(working_collection)
                 return
 
@@ -228,6 +919,11 @@ class Decompose:
                     # Set new best possible solution
                     best_known_solution = working_collection
                     best_known_coverage = working_collection.coverage_sum
+
+                    if self._report_incumbent(best_known_solution.shifts,
+                                              best_known_coverage, root_bound):
+                        self._stop_on_gap()
+                        break
                 else:
                     logger.debug("Found less optimal solution - continuing")
                     # discard
@@ -236,70 +932,93 @@ class Decompose:
             else:
 
                 # New branch to explore - else discard
-                if working_collection.best_possible_coverage < best_known_coverage:
+                if (self._lower_bound(working_collection) < best_known_coverage
+                        and not transpositions.is_dominated(
+                            working_collection.get_state_key(),
+                            working_collection.coverage_sum)):
                     # Gotta add more shifts!
                     t = working_collection.get_first_time_demand_not_met()
 
                     # Get shift start time
                     start = t
-                    for length in reverse_inclusive_range(self.min_length,
-                                                          self.max_length):
-                        # Make sure we aren't off edge
-                        end_index = start + length
-
-                        # Our edge smoothing means this will always work
-                        if end_index <= len(self.demand):
-                            shift = (start, length)
-                            new_collection = deepcopy(working_collection)
-                            new_collection.add_shift(shift)
+                    for length in self._get_branch_lengths(start):
+                        shift = (start, length)
+                        new_collection = deepcopy(working_collection)
+                        new_collection.add_shift(shift)
 
-                            if new_collection.demand_is_met:
-                                new_collection.anneal()
+                        if new_collection.demand_is_met:
+                            new_collection.anneal()
 
-                            if new_collection.best_possible_coverage < best_known_coverage:
+                        if new_collection.best_possible_coverage < best_known_coverage:
 
-                                # Only save it if it's an improvement
-                                stack.append(new_collection)
+                            # Only save it if it's an improvement
+                            stack.append(new_collection)
 
+        logger.debug("Transposition table pruned %s branches",
+                     transpositions.hits)
         self.set_shift_collection_as_optimal(best_known_solution)
 
-    def use_heuristics_to_generate_some_solution(self):
-        """Use heuristics to generate some feasible solution."""
-        # (Used for branch and bound)
-
-        # Heuristic: Fill in only shifts of smallest shift len
-
-        collection = ShiftCollection(
-            self.min_length, self.max_length, demand=self.demand)
-
-        # Add shifts for the end
-
-        length = self.min_length
-        start = len(self.demand) - length
-        end_shift = (start, length)
-        for _ in range(self.demand[-1]):
-            collection.add_shift(end_shift)
-
-        # And now, go through time and add shifts
-        for t in range(len(self.demand)):
-            delta = collection.get_demand_minus_coverage(t)
+    def _get_starting_solution(self):
+        """Return a first solution and the coverage a search must beat"""
+        solution = self.use_heuristics_to_generate_some_solution()
+        if config.WARM_START:
+            warm_solution = find_warm_start(self)
+            if (warm_solution is not None and
+                    warm_solution.coverage_sum < solution.coverage_sum):
+                logger.info(
+                    "Warm start coverage %s beats heuristic coverage %s",
+                    warm_solution.coverage_sum, solution.coverage_sum)
+                solution = warm_solution
+                self.starting_heuristic = "warm_start"
+
+        # Searches only keep strictly better solutions. Letting them tie
+        # anything but the min length fill means they still pick the same
+        # optimal shifts as before, while pruning almost as much.
+        coverage_to_beat = solution.coverage_sum
+        if self.starting_heuristic != "min_length_fill":
+            coverage_to_beat += 1
+
+        return solution, coverage_to_beat
 
-            start = t
-            length = self.min_length
-
-            # On short problems we can exceed end
-            if start + length > len(self.demand):
-                start = len(self.demand) - length
+    def use_heuristics_to_generate_some_solution(self):
+        """Use heuristics to generate some feasible solution.
 
-            shift = (start, length)
+        Each of the configured HEURISTICS runs in turn until
+        HEURISTIC_TIMEOUT, and the one with the least coverage wins. Its name
+        is kept in starting_heuristic.
+        """
+        # (Used for branch and bound)
+        if self.deadline is None:
+            deadline = Deadline(config.HEURISTIC_TIMEOUT)
+        else:
+            deadline = self.deadline.cap(config.HEURISTIC_TIMEOUT)
+
+        best_solution = None
+        for name in config.HEURISTICS:
+            if name not in HEURISTICS:
+                raise Exception("Unknown heuristic %s" % name)
+
+            # The first heuristic always runs so there is a solution
+            if best_solution is not None and deadline.expired():
+                logger.debug("No time left for heuristic %s", name)
+                break
 
-            for _ in range(delta):
-                collection.add_shift(shift)
+            collection = self._new_collection(shifts=HEURISTICS[name](
+                self.demand, self.min_length, self.max_length))
+            if not collection.demand_is_met:
+                raise Exception("Heuristic %s for finding demand failed" %
+                                name)
 
-        if not collection.demand_is_met:
-            raise Exception("Heuristic for finding demand failed")
+            logger.debug("Heuristic %s has coverage %s", name,
+                         collection.coverage_sum)
+            if (best_solution is None or
+                    collection.coverage_sum < best_solution.coverage_sum):
+                best_solution = collection
+                self.starting_heuristic = name
 
-        return collection
+        logger.info("Heuristic %s won with coverage %s",
+                    self.starting_heuristic, best_solution.coverage_sum)
+        return best_solution
 
     def set_shift_collection_as_optimal(self, collection):
         """Update decomposition model with our results"""
@@ -312,3 +1031,123 @@ class Decompose:
                 "length": length,
             })
         self._set_cache()
+
+        if config.WARM_START and not self.stopped_early:
+            record_warm_start(self, collection.shifts)
+
+
+def init_worker_process():
+    """Set up a forked pool process before it solves any problems
+
+    Pools whose processes use Decompose should run this first, e.g. as
+    their initializer. It disconnects the cache so the process opens its
+    own connections instead of sharing the parent's, drops cache writes
+    the parent deferred (the parent still makes them), and sets
+    config.THREADS to 1, since daemonic pool processes cannot start pools
+    of their own.
+    """
+    cache.disconnect()
+    config.THREADS = 1
+
+
+def _solve_subproblem(problem):
+    """Solve a subproblem that is small enough to search
+
+    Returns its shifts, whether it stopped within the acceptable gap and
+    whether it ran out of time.
+    """
+    problem._calculate()
+    return problem._shifts, problem.stopped_on_gap, problem.stopped_early
+
+
+# Pool kept between parallel searches as (process id, config settings,
+# pool, incumbents)
+_search_pool = None
+
+# Incumbents shared with the parent, in parallel search pool processes
+_worker_incumbents = None
+
+
+def _get_search_pool(subtrees):
+    """A pool of THREADS processes and incumbents for at least subtrees
+
+    Starting processes costs more than many searches, so the pool is reused
+    until a search has more subtrees than it can hold. Workers keep the
+    config they were forked with, so it is also replaced if that changes.
+    """
+    global _search_pool
+    settings = _get_config_settings()
+    if _search_pool is not None:
+        pid, pool_settings, pool, incumbents = _search_pool
+        if (pid == os.getpid() and pool_settings == settings and
+                len(incumbents) >= subtrees):
+            return pool, incumbents
+        _close_search_pool()
+
+    size = max(subtrees, config.THREADS * config.PARALLEL_SUBTREES_PER_THREAD)
+    incumbents = multiprocessing.Array("l", size, lock=False)
+    pool = multiprocessing.Pool(
+        config.THREADS,
+        initializer=_init_search_worker,
+        initargs=(incumbents, ))
+    _search_pool = (os.getpid(), settings, pool, incumbents)
+    return pool, incumbents
+
+
+def _close_search_pool():
+    """Stop the parallel search pool so the next search starts a new one"""
+    global _search_pool
+    if _search_pool is None:
+        return
+
+    pid, _, pool, _ = _search_pool
+    _search_pool = None
+    # A forked process must leave its parent's pool alone
+    if pid == os.getpid():
+        pool.terminate()
+        pool.join()
+
+
+def _get_config_settings():
+    """Every setting in the config, to tell whether it has changed"""
+    return [(name, getattr(config, name)) for name in dir(config)
+            if name.isupper()]
+
+
+def _init_search_worker(incumbents):
+    """Set up a pool process for parallel search"""
+    # Workers are forked, so they inherit the incumbents rather than
+    # having them pickled
+    global _worker_incumbents
+    _worker_incumbents = incumbents
+
+
+def _search_parallel_subtree(task):
+    """Pool worker that searches one subtree with shared incumbents"""
+    (decompose, index, subtrees, path, best_known_coverage, best_known_shifts,
+     root_bound, deadline) = task
+    incumbents = _worker_incumbents
+
+    def get_shared_limit():
+        # Beat earlier subtrees, but only tie later ones
+        limit = None
+        for other in range(subtrees):
+            if other == index:
+                continue
+            other_limit = incumbents[other]
+            if other > index:
+                other_limit += 1
+            if limit is None or other_limit < limit:
+                limit = other_limit
+        return limit
+
+    def on_improvement(coverage):
+        incumbents[index] = coverage
+
+    collection = decompose._new_collection()
+    decompose._move_to_path(collection, (), path)
+    coverage, shifts = decompose._search_subtree(
+        collection, best_known_coverage, best_known_shifts, root_bound,
+        deadline, get_shared_limit, on_improvement)
+    return (index, coverage, shifts, decompose.stopped_on_gap,
+            decompose.stopped_early)
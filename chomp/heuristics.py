@@ -0,0 +1,189 @@
+# Construction heuristics for a first solution to a demand.
+#
+# Each returns (start, length) shifts that meet demand everywhere. Decompose
+# runs the configured heuristics and starts its search from the best one, so
+# they must be fast compared with the search itself.
+
+
+def min_length_fill(demand, min_length, max_length):
+    """Add min length shifts wherever demand is not yet met"""
+    demand_length = len(demand)
+    coverage = [0] * demand_length
+    shifts = []
+
+    # Shifts for the end, which might otherwise be cut short
+    end_shift = (demand_length - min_length, min_length)
+    for _ in range(demand[-1]):
+        _add_shift(shifts, coverage, end_shift)
+
+    for t in range(demand_length):
+        shift = (min(t, demand_length - min_length), min_length)
+        for _ in range(demand[t] - coverage[t]):
+            _add_shift(shifts, coverage, shift)
+
+    return shifts
+
+
+def longest_shift(demand, min_length, max_length):
+    """Add the longest shift that is all needed wherever demand is not met
+
+    Shifts still last at least min length, so they may cover some overage.
+    """
+    demand_length = len(demand)
+    coverage = [0] * demand_length
+    shifts = []
+
+    for t in range(demand_length):
+        while coverage[t] < demand[t]:
+            start = min(t, demand_length - min_length)
+            end = t
+            while (end < demand_length and end - start < max_length and
+                   coverage[end] < demand[end]):
+                end += 1
+            length = max(end - start, min_length)
+            _add_shift(shifts, coverage, (start, length))
+
+    return shifts
+
+
+def layer_peeling(demand, min_length, max_length):
+    """Cover runs of unmet demand one layer at a time
+
+    Each run is split into shifts as evenly as shift lengths allow. Overage
+    from one layer counts towards the layers above it.
+    """
+
+    def cover_run(start, end):
+        return _split_run(start, end, min_length, max_length, len(demand))
+
+    return _peel_layers(demand, cover_run)
+
+
+def layer_dynamic_program(demand, min_length, max_length):
+    """Cover each layer of unmet demand with as little time as possible
+
+    A dynamic program over times finds the cheapest shifts that cover every
+    unmet time of the layer at least once.
+    """
+    demand_length = len(demand)
+    infinity = float("inf")
+    max_length = min(max_length, demand_length)
+
+    def cover_layer(unmet):
+        # costs[e] is the least time for shifts within [0, e) that cover
+        # every unmet time before e. choices[e] rebuilds those shifts.
+        costs = [0] + [infinity] * demand_length
+        choices = [None] * (demand_length + 1)
+        for end in range(1, demand_length + 1):
+            if not unmet[end - 1]:
+                costs[end] = costs[end - 1]
+                choices[end] = (end - 1, None)
+
+            # Longest shifts first, so they win ties
+            for length in range(max_length, min_length - 1, -1):
+                start = end - length
+                if start < 0:
+                    continue
+
+                # The shift covers [start, end), so it may follow any state
+                # that ends within it
+                for previous in range(start, end):
+                    cost = costs[previous] + length
+                    if cost < costs[end]:
+                        costs[end] = cost
+                        choices[end] = (previous, (start, length))
+
+        shifts = []
+        end = demand_length
+        while end > 0:
+            previous, shift = choices[end]
+            if shift is not None:
+                shifts.append(shift)
+            end = previous
+
+        return shifts[::-1]
+
+    return _peel_layers(demand, cover_layer, whole_layer=True)
+
+
+def _peel_layers(demand, cover, whole_layer=False):
+    """Cover the lowest layer of unmet demand until demand is met
+
+    cover is given a run of unmet times as start and end, or the whole layer
+    as a list of whether each time is unmet.
+    """
+    demand_length = len(demand)
+    coverage = [0] * demand_length
+    shifts = []
+
+    while True:
+        unmet = [coverage[t] < demand[t] for t in range(demand_length)]
+        if not any(unmet):
+            return shifts
+
+        if whole_layer:
+            layer_shifts = cover(unmet)
+        else:
+            layer_shifts = []
+            for start, end in _get_runs(unmet):
+                layer_shifts.extend(cover(start, end))
+
+        for shift in layer_shifts:
+            _add_shift(shifts, coverage, shift)
+
+
+def _get_runs(unmet):
+    """(start, end) of each run of unmet times"""
+    runs = []
+    start = None
+    for t, is_unmet in enumerate(unmet + [False]):
+        if is_unmet and start is None:
+            start = t
+        elif not is_unmet and start is not None:
+            runs.append((start, t))
+            start = None
+    return runs
+
+
+def _split_run(start, end, min_length, max_length, demand_length):
+    """Shifts that cover [start, end), with overage only where required"""
+    run_length = end - start
+    if run_length < min_length:
+        return [(min(start, demand_length - min_length), min_length)]
+
+    # As few shifts as possible, as even as possible
+    count = -(-run_length // max_length)
+    length, extra = divmod(run_length, count)
+    if length >= min_length:
+        shifts = []
+        for i in range(count):
+            shift_length = length + 1 if i < extra else length
+            shifts.append((start, shift_length))
+            start += shift_length
+        return shifts
+
+    # The run is too short to split evenly, so the last shift overlaps
+    shifts = []
+    while end - start > max_length:
+        shifts.append((start, max_length))
+        start += max_length
+    if end - start >= min_length:
+        shifts.append((start, end - start))
+    else:
+        shifts.append((end - min_length, min_length))
+    return shifts
+
+
+def _add_shift(shifts, coverage, shift):
+    start, length = shift
+    shifts.append(shift)
+    for t in range(start, start + length):
+        coverage[t] += 1
+
+
+HEURISTICS = {
+    "min_length_fill": min_length_fill,
+    "longest_shift": longest_shift,
+    "layer_peeling": layer_peeling,
+    "layer_dynamic_program": layer_dynamic_program,
+}
@@ -0,0 +1,144 @@
+import heapq
+
+from chomp.exceptions import CalculationException
+from chomp.helpers import inclusive_range
+
+
+class MinCostFlow(object):
+    """Successive shortest path min cost flow on a small directed graph"""
+
+    def __init__(self, node_count):
+        self.node_count = node_count
+        # Each edge is [target, residual capacity, cost, reverse edge]
+        self._graph = [[] for _ in range(node_count)]
+
+    def add_edge(self, source, target, capacity, cost):
+        """Add an edge and return it so its flow can be read later"""
+        forward = [target, capacity, cost, None]
+        backward = [source, 0, -cost, forward]
+        forward[3] = backward
+        self._graph[source].append(forward)
+        self._graph[target].append(backward)
+        return forward
+
+    @staticmethod
+    def get_flow(edge):
+        """Return how much flow was sent along an edge from add_edge"""
+        return edge[3][1]
+
+    def solve(self, source, sink, required):
+        """Send required units from source to sink at minimum cost"""
+        # Costs are non-negative, so potentials can start at zero and
+        # Dijkstra stays valid on the reduced costs.
+        potential = [0] * self.node_count
+        sent = 0
+        total_cost = 0
+
+        while sent < required:
+            distance = [None] * self.node_count
+            previous = [None] * self.node_count
+            distance[source] = 0
+            heap = [(0, source)]
+
+            while heap:
+                dist, node = heapq.heappop(heap)
+                if dist > distance[node]:
+                    continue
+
+                for edge in self._graph[node]:
+                    target, capacity, cost, _ = edge
+                    if capacity <= 0:
+                        continue
+
+                    new_dist = dist + cost + potential[node] - potential[
+                        target]
+                    if distance[target] is None or new_dist < distance[target]:
+                        distance[target] = new_dist
+                        previous[target] = edge
+                        heapq.heappush(heap, (new_dist, target))
+
+            if distance[sink] is None:
+                raise CalculationException(
+                    "Unable to route flow (sent %s of %s)" % (sent, required))
+
+            for node in range(self.node_count):
+                if distance[node] is not None:
+                    potential[node] += distance[node]
+
+            # Find the bottleneck, then push flow along the path
+            push = required - sent
+            node = sink
+            while node != source:
+                edge = previous[node]
+                push = min(push, edge[1])
+                node = edge[3][0]
+
+            node = sink
+            while node != source:
+                edge = previous[node]
+                edge[1] -= push
+                edge[3][1] += push
+                node = edge[3][0]
+
+            sent += push
+            total_cost += push * (potential[sink] - potential[source])
+
+        return total_cost
+
+
+def decompose_with_min_cost_flow(demand, min_length, max_length):
+    """Return (start, length) shifts that cover demand with the least time
+
+    Every shift covers consecutive times, so taking differences of the
+    coverage constraints turns them into flow conservation. Node t is the
+    boundary before time t. A shift is an edge from its start to its end,
+    and an edge from t + 1 back to t absorbs overage at time t. Wherever
+    demand rises is a supply and wherever it falls is a sink. The matrix is
+    totally unimodular, so the min cost flow is an exact integer answer.
+    """
+    demand_length = len(demand)
+    if demand_length < min_length:
+        raise CalculationException("Demand shorter than min length (%s < %s)" %
+                                   (demand_length, min_length))
+
+    # Minimize total time first, then prefer fewer (so longer) shifts. Each
+    # shift in an optimal answer covers some demand, so the number of shifts
+    # never reaches this multiplier.
+    multiplier = sum(demand) + 1
+    unbounded = sum(demand) + 1
+
+    source = demand_length + 1
+    sink = demand_length + 2
+    flow = MinCostFlow(demand_length + 3)
+
+    shift_edges = []
+    for start in range(demand_length):
+        for length in inclusive_range(min_length, max_length):
+            if start + length > demand_length:
+                break
+            edge = flow.add_edge(start, start + length, unbounded,
+                                 length * multiplier + 1)
+            shift_edges.append((start, length, edge))
+
+    for t in range(demand_length):
+        flow.add_edge(t + 1, t, unbounded, 0)
+
+    required = 0
+    previous = 0
+    for t in range(demand_length + 1):
+        current = demand[t] if t < demand_length else 0
+        change = current - previous
+        if change > 0:
+            flow.add_edge(source, t, change, 0)
+            required += change
+        elif change < 0:
+            flow.add_edge(t, sink, -change, 0)
+        previous = current
+
+    flow.solve(source, sink, required)
+
+    shifts = []
+    for start, length, edge in shift_edges:
+        shifts.extend([(start, length)] * MinCostFlow.get_flow(edge))
+
+    return shifts
@@ -0,0 +1,122 @@
+import hashlib
+import struct
+
+import numpy
+
+from chomp.coverage import get_coverage
+from chomp.shift_collection import ShiftCollection
+
+# Demand and coverage per time are small (demand above the bifurcation
+# threshhold is split), so a 16 bit integer is plenty.
+COVERAGE_DTYPE = numpy.int16
+
+
+class NumpyShiftCollection(ShiftCollection):
+    """A group of shifts with demand and coverage stored as NumPy arrays
+
+    Behaves exactly like ShiftCollection, but coverage is updated a whole
+    shift at a time and score_shifts evaluates every candidate length in
+    one vectorized step.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, min_length, max_length, demand=None, shifts=None):
+        if demand is None:
+            demand = []
+
+        if len(demand) > 0 and max(demand) > numpy.iinfo(COVERAGE_DTYPE).max:
+            raise Exception("Demand too large for compact collection")
+
+        super(NumpyShiftCollection, self).__init__(
+            min_length,
+            max_length,
+            demand=numpy.array(demand, dtype=COVERAGE_DTYPE))
+        self._coverage = numpy.zeros(self.demand_length, dtype=COVERAGE_DTYPE)
+
+        # Recompute totals as plain ints rather than numpy scalars
+        self._demand_sum = int(self._demand.sum())
+        self._unmet_sum = int(numpy.maximum(self._demand, 0).sum())
+        self._overage_sum = int(numpy.maximum(-self._demand, 0).sum())
+
+        if shifts is not None and len(shifts) > 0:
+            self._add_initial_shifts(shifts)
+
+    def _add_initial_shifts(self, shifts):
+        """Add many shifts to a collection that has no coverage yet"""
+        self._coverage += numpy.array(
+            get_coverage(shifts, self.demand_length), dtype=COVERAGE_DTYPE)
+
+        residual = self._demand - self._coverage
+        self._coverage_sum = int(self._coverage.sum())
+        self._unmet_sum = int(numpy.maximum(residual, 0).sum())
+        self._overage_sum = int(numpy.maximum(-residual, 0).sum())
+        self._advance_first_unmet()
+        self._shifts.extend(shifts)
+
+    def get_demand_minus_coverage(self, t):
+        """Return needs vs. shift coverage at time"""
+        return int(self._demand[t]) - int(self._coverage[t])
+
+    def get_state_key(self):
+        """Digest of the first unmet time and demand minus coverage after it"""
+        residual = (self._demand[self._first_unmet:] -
+                    self._coverage[self._first_unmet:])
+        key = hashlib.md5(struct.pack("<i", self._first_unmet))
+        key.update(residual.tobytes())
+        return key.digest()
+
+    def _add_coverage(self, start, end, delta):
+        """Adjust coverage over a range without recording it"""
+        before = self._demand[start:end] - self._coverage[start:end]
+        self._coverage[start:end] += delta
+        after = before - delta
+
+        self._coverage_sum += delta * (end - start)
+        self._unmet_sum += int(
+            numpy.maximum(after, 0).sum() - numpy.maximum(before, 0).sum())
+        self._overage_sum += int(
+            numpy.maximum(-after, 0).sum() - numpy.maximum(-before, 0).sum())
+
+        unmet = numpy.flatnonzero(after > 0)
+        if unmet.size > 0 and start + unmet[0] < self._first_unmet:
+            self._first_unmet = start + int(unmet[0])
+
+    def _advance_first_unmet(self):
+        """Move the first unmet pointer past any times that are now covered"""
+        unmet = numpy.flatnonzero(self._demand[self._first_unmet:] >
+                                  self._coverage[self._first_unmet:])
+        if unmet.size > 0:
+            self._first_unmet += int(unmet[0])
+        else:
+            self._first_unmet = self.demand_length
+
+    def score_shifts(self, start, lengths):
+        """Return best possible coverage after adding a shift of each length
+
+        New coverage, bound and feasibility are computed for every length at
+        once. Only lengths that meet demand are applied one by one, because
+        annealing can lower their bound.
+        """
+        if len(lengths) == 0:
+            return []
+
+        lengths = numpy.array(lengths)
+        end = start + lengths.max()
+        delta = self._demand[start:end] - self._coverage[start:end]
+
+        # Units of each new shift that land on unmet demand vs. overage
+        unmet_covered = numpy.cumsum(delta > 0)[lengths - 1]
+        overage_added = lengths - unmet_covered
+
+        scores = self._demand_sum + self._overage_sum + overage_added
+        feasible = unmet_covered == self._unmet_sum
+
+        for i in numpy.flatnonzero(feasible):
+            self.checkpoint()
+            self.add_shift((start, int(lengths[i])))
+            self.anneal()
+            scores[i] = self.best_possible_coverage
+            self.rollback()
+
+        return [int(score) for score in scores]
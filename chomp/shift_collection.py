@@ -1,9 +1,24 @@
+import hashlib
+import struct
+
 from chomp import logger
+from chomp.coverage import get_coverage
+
+# Kinds of trail entries recorded while a checkpoint is open
+_TRAIL_COVERAGE = 0
+_TRAIL_APPEND = 1
+_TRAIL_REPLACE = 2
 
 
 class ShiftCollection(object):
     """A group of shifts"""
 
+    # Many collections can be alive during a search, so keep them small
+    __slots__ = ("_demand", "demand_length", "_coverage", "_demand_sum",
+                 "_coverage_sum", "_unmet_sum", "_overage_sum", "_first_unmet",
+                 "min_length", "max_length", "_shifts", "_trail",
+                 "_checkpoints")
+
     def __init__(self, min_length, max_length, demand=None, shifts=None):
         if demand is None:
             demand = []
@@ -14,6 +29,15 @@ class ShiftCollection(object):
         self.demand_length = len(self._demand)
         self._coverage = [0] * self.demand_length
 
+        # Running totals so that search properties are O(1) reads.
+        # They are kept current by _change_coverage.
+        self._demand_sum = sum(self._demand)
+        self._coverage_sum = 0
+        self._unmet_sum = sum(val for val in self._demand if val > 0)
+        self._overage_sum = sum(-val for val in self._demand if val < 0)
+        self._first_unmet = 0
+        self._advance_first_unmet()
+
         # Used for annealing
         self.min_length = min_length
         self.max_length = max_length
@@ -21,9 +45,14 @@ class ShiftCollection(object):
         # initiate as empty
         self._shifts = []
 
+        # Undo log for searching on a single collection. Changes are only
+        # recorded while a checkpoint is open.
+        self._trail = []
+        self._checkpoints = []
+
         # Add in shifts so coverage cache is populated
-        for shift in shifts:
-            self.add_shift(shift)
+        if len(shifts) > 0:
+            self._add_initial_shifts(shifts)
 
     @property
     def shifts(self):
@@ -42,10 +71,100 @@ class ShiftCollection(object):
                 "Shift lies outside demand bounds (demand length %s, shift start %s, shift end %s,",
                 self.demand_length, start, end_index)
 
-        for t in range(start, end_index):
-            self._coverage[t] += 1
-
+        self._add_coverage(start, end_index, 1)
+        self._advance_first_unmet()
         self._shifts.append(shift)
+        if self._checkpoints:
+            self._trail.append((_TRAIL_APPEND, None, None))
+
+    def _add_initial_shifts(self, shifts):
+        """Add many shifts to a collection that has no coverage yet"""
+        # Counting coverage first touches each time once, rather than once
+        # for every shift that covers it
+        coverage = get_coverage(shifts, self.demand_length)
+        for t in range(self.demand_length):
+            if coverage[t] != 0:
+                self._change_coverage(t, coverage[t], record=False)
+
+        self._advance_first_unmet()
+        self._shifts.extend(shifts)
+
+    def score_shifts(self, start, lengths):
+        """Return best possible coverage after adding a shift of each length
+
+        Collections that meet demand are annealed first, just as when
+        branching in a search. The collection is left unchanged.
+        """
+        scores = []
+        for length in lengths:
+            self.checkpoint()
+            self.add_shift((start, length))
+            if self.demand_is_met:
+                self.anneal()
+            scores.append(self.best_possible_coverage)
+            self.rollback()
+
+        return scores
+
+    def _replace_shift(self, i, shift):
+        """Swap out a shift without touching coverage"""
+        if self._checkpoints:
+            self._trail.append((_TRAIL_REPLACE, i, self._shifts[i]))
+        self._shifts[i] = shift
+
+    def _add_coverage(self, start, end, delta):
+        """Adjust coverage over a range without recording it"""
+        # add_shift records the shift itself, which is enough to undo this
+        for t in range(start, end):
+            self._change_coverage(t, delta, record=False)
+
+    def _change_coverage(self, t, delta, record=True):
+        """Adjust coverage at a time and keep the running totals current"""
+        if record and self._checkpoints:
+            self._trail.append((_TRAIL_COVERAGE, t, delta))
+
+        before = self.get_demand_minus_coverage(t)
+        self._coverage[t] += delta
+        after = before - delta
+
+        self._coverage_sum += delta
+        self._unmet_sum += max(after, 0) - max(before, 0)
+        self._overage_sum += max(-after, 0) - max(-before, 0)
+
+        if after > 0 and t < self._first_unmet:
+            self._first_unmet = t
+
+    def _advance_first_unmet(self):
+        """Move the first unmet pointer past any times that are now covered"""
+        # Coverage only goes up while searching, so this is amortized
+        while (self._first_unmet < self.demand_length and
+               self._demand[self._first_unmet] <=
+               self._coverage[self._first_unmet]):
+            self._first_unmet += 1
+
+    @property
+    def depth(self):
+        """How many checkpoints are open"""
+        return len(self._checkpoints)
+
+    def checkpoint(self):
+        """Start recording changes so that rollback() can revert them"""
+        self._checkpoints.append((len(self._trail), self._first_unmet))
+
+    def rollback(self):
+        """Revert every change made since the most recent checkpoint"""
+        trail_length, first_unmet = self._checkpoints.pop()
+        while len(self._trail) > trail_length:
+            kind, index, value = self._trail.pop()
+            if kind == _TRAIL_COVERAGE:
+                self._change_coverage(index, -value, record=False)
+            elif kind == _TRAIL_APPEND:
+                start, length = self._shifts.pop()
+                self._add_coverage(start, start + length, -1)
+            else:
+                self._shifts[index] = value
+
+        self._first_unmet = first_unmet
 
     def get_demand_minus_coverage(self, t):
         """Return needs vs. shift coverage at time"""
@@ -56,53 +175,49 @@ class ShiftCollection(object):
 
     @property
     def coverage_sum(self):
-        return sum(self._coverage)
+        return self._coverage_sum
 
     @property
     def best_possible_coverage(self):
         """Look at current shift + demand needing to be covered"""
-        best_possible = sum(self._demand)
-        for t in range(self.demand_length):
-            delta = self.get_demand_minus_coverage(t)
-            if delta < 0:
-                best_possible += abs(delta)
-
-        return best_possible
+        return self._demand_sum + self._overage_sum
 
     @property
     def demand_is_met(self):
         """Has a solution been found?"""
-        for t in range(self.demand_length):
-            if self.get_demand_minus_coverage(t) > 0:
-                return False
-
-        return True
+        return self._unmet_sum == 0
 
     @property
     def shift_count(self):
         """Return how many shifts we have"""
         return len(self._shifts)
 
+    def get_state_key(self):
+        """Digest of the first unmet time and demand minus coverage after it
+
+        Collections with the same key can be completed by the same shifts.
+        The digest keeps keys small whatever the demand length, and states
+        are far too few for an MD5 collision to be a concern.
+        """
+        residual = [
+            self._demand[t] - self._coverage[t]
+            for t in range(self._first_unmet, self.demand_length)
+        ]
+        return hashlib.md5(
+            struct.pack("<%di" % (len(residual) + 1), self._first_unmet,
+                        *residual)).digest()
+
     def get_first_time_demand_not_met(self):
         """Find the first time the demand is not met"""
-        for t in range(self.demand_length):
-            if self._demand[t] > self._coverage[t]:
-                return t
+        if self._first_unmet < self.demand_length:
+            return self._first_unmet
 
         raise Exception("Infeasible answer- demand is met %s %s %s" %
                         (self.demand_is_met, self._demand, self._coverage))
 
     @property
     def is_optimal(self):
-        for t in range(self.demand_length):
-            delta = self.get_demand_minus_coverage(t)
-            if delta != 0:
-                return False
-
-            if delta < 0:
-                return False
-
-        return True
+        return self._unmet_sum == 0 and self._overage_sum == 0
 
     def anneal(self):
         """Look for overages and try to fix them"""
@@ -127,14 +242,14 @@ class ShiftCollection(object):
                         start, length = self._shifts[i]
                         end = start + length
                         if start == t and length > self.min_length:
-                            self._shifts[i] = (start + 1, length - 1)
-                            self._coverage[t] -= 1
+                            self._replace_shift(i, (start + 1, length - 1))
+                            self._change_coverage(t, -1)
                             time_saved += 1
                             improvement_made = True
 
                         if end == t and length > self.max_length:
-                            self._shifts[i] = (start, length - 1)
-                            self._coverage[t] -= 1
+                            self._replace_shift(i, (start, length - 1))
+                            self._change_coverage(t, -1)
                             time_saved += 1
                             improvement_made = True
 
@@ -1,7 +1,10 @@
-import copy
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
-from chomp import logger
-from chomp.decompose import Decompose
+from chomp import logger, cache, config
+from chomp.coverage import get_coverage
+from chomp.deadline import Deadline
+from chomp.decompose import Decompose, init_worker_process
 from chomp.exceptions import UnequalDayLengthException
 
 
@@ -15,9 +18,10 @@ class Splitter(object):
     is considered circular such that, if a business is open from 8pm to 2am,
     then the final day of the week will wrap into the following week.
 
-    24/7 demand is split day by day right now. In the future, splitting it into
-    overlapping sections (e.g. a midnight->noon, 8am-4pm, and noon-midnight)
-    may be best for handling large demand.
+    24/7 demand is split day by day by default. With ALWAYS_OPEN_WINDOWS set
+    to "overlapping", it is instead split into overlapping sections (e.g.
+    midnight->noon, 8am-4pm, and noon-midnight) that are stitched together
+    at their seams.
     """
 
     def __init__(self, week_demand, min_length, max_length):
@@ -31,6 +35,7 @@ class Splitter(object):
 
         self._shifts = []  # don't access directly!
         self._windows = []
+        self._overlapping = False  # Whether windows overlap (24/7 only)
 
         self.week_length = len(week_demand)
 
@@ -45,19 +50,84 @@ class Splitter(object):
             item for day_demand in week_demand for item in day_demand
         ]
 
-    def calculate(self):
-        # Generate subproblems
-        self._generate_windows()
-        self._solve_windows()
+    def calculate(self, deadline=None):
+        """Solve the week, by TASK_TIMEOUT from now unless given a deadline"""
+        for _ in self._solve(deadline):
+            pass
+
+    def iter_shifts(self):
+        """Calculate, yielding shifts as soon as each window is solved
+
+        Shifts are in the same format and order as get_shifts(), which also
+        works once they have all been yielded. Time the caller spends on
+        shifts does not count against TASK_TIMEOUT. Only with
+        WINDOW_PROCESSES above 1 do later windows keep solving meanwhile;
+        otherwise each window starts once the caller asks for more shifts.
+        """
+        for window_shifts in self._solve():
+            for shift in window_shifts:
+                yield self._to_day_shift(shift)
 
     def get_shifts(self):
         # Remove window and return shifts day by day
-        shifts = copy.copy(self._shifts)
-        for shift in shifts:
-            shift["day"] = self._flat_index_to_day(shift["start"])
-            shift["start"] = self._flat_index_to_time(shift["start"])
+        return [self._to_day_shift(shift) for shift in self._shifts]
+
+    def window_keys(self):
+        """Identify each window by its length limits and demand
+
+        Keys are (min_length, max_length, demand), in the order of the
+        windows. Overlapping windows depend on each other rather than only
+        their own demand, so there are no keys for them and None is returned.
+        """
+        self._ensure_windows()
+        if self._overlapping:
+            return None
+
+        return [(self.min_length, self.max_length,
+                 tuple(self._get_window_demand(start, stop)))
+                for (start, stop) in self._windows]
+
+    def add_window_solutions(self, solutions):
+        """Keep each window's shifts from a dict of window key to shifts
+
+        Shifts are relative to the window start, as from solve_windows().
+        """
+        for (start, _), key in zip(self._windows, self.window_keys()):
+            self._add_window_shifts(start, solutions[key])
 
-        return shifts
+    def _solve(self, deadline=None):
+        """Generate and solve windows, yielding each window's shifts"""
+        # One time budget for the whole week
+        if deadline is None:
+            deadline = Deadline(config.TASK_TIMEOUT)
+
+        # Generate subproblems
+        self._ensure_windows()
+        if self._overlapping:
+            windows = self._solve_overlapping_windows(deadline)
+        else:
+            windows = self._solve_windows(deadline)
+
+        # Cache writes reach the backend together once the week is solved
+        with cache.deferred_writes():
+            for window_shifts in windows:
+                # The deadline is for solving, not for what the caller does
+                # with each window's shifts (e.g. uploading them)
+                with deadline.paused():
+                    yield window_shifts
+
+    def _to_day_shift(self, shift):
+        """Convert a shift from flat demand indexes to a day and start"""
+        return {
+            "day": self._flat_index_to_day(shift["start"]),
+            "start": self._flat_index_to_time(shift["start"]),
+            "length": shift["length"],
+        }
+
+    def _ensure_windows(self):
+        """Generate windows unless they already have been"""
+        if len(self._windows) == 0:
+            self._generate_windows()
 
     def _generate_windows(self):
         """Generate the demand subproblems to solve."""
@@ -65,6 +135,14 @@ class Splitter(object):
 
         # Check for 24/7 edge case
         if self._is_always_open():
+            if config.ALWAYS_OPEN_WINDOWS == "overlapping":
+                self._generate_overlapping_windows()
+                return
+
+            if config.ALWAYS_OPEN_WINDOWS != "day":
+                raise Exception("Unknown always open windows %s" %
+                                config.ALWAYS_OPEN_WINDOWS)
+
             # Break it into day by day
             for i in range(self.week_length):
                 start = i * self.day_length
@@ -73,20 +151,52 @@ class Splitter(object):
 
             return
 
-        # Stop condition is based on start becuase of circular wraping
-        for start in range(len(self.flat_demand)):
-            if (self.flat_demand[start] is not 0) and (
-                    start is 0 or self.flat_demand[start - 1] is 0):
-                for end in range(start + 1,
-                                 len(self.flat_demand) + self.max_length):
-
-                    if self._get_flat_demand(end) is 0 and (
-                            start == (end - 1) or
-                            self._get_flat_demand(end - 1) is not 0):
-                        # Add to window . . . mayb
-                        # off by 1 becuase of exclusive
-                        self._add_window(start, end)
-                        break
+        for start, end in self._get_open_runs():
+            self._add_window(start, end)
+
+    def _generate_overlapping_windows(self):
+        """Split always open demand into overlapping windows
+
+        Windows start OVERLAP_WINDOW_STEP of a day apart, and each looks max
+        length past the next one's start so the shifts that start before it
+        see all of the demand they cover. The week is cut at its quietest
+        time, which is the only seam that is not stitched.
+        """
+        self._overlapping = True
+        step = max(int(round(self.day_length * config.OVERLAP_WINDOW_STEP)), 1)
+        first = self.flat_demand.index(min(self.flat_demand))
+        for start in range(first, first + len(self.flat_demand), step):
+            self._windows.append((start, start + step + self.max_length))
+
+    def _get_open_runs(self):
+        """Run length encode demand into (start, end) runs of nonzero demand
+
+        Demand is circular, so a run still open at the end of the week
+        continues into the start of the next week and ends past the last
+        index. A run open at index 0 is also kept on its own, and dropped by
+        _add_window when it is shorter than the min length.
+        """
+        runs = []
+        run_start = None
+        for t, value in enumerate(self.flat_demand):
+            if value != 0:
+                if run_start is None:
+                    run_start = t
+            elif run_start is not None:
+                runs.append((run_start, t))
+                run_start = None
+
+        if run_start is not None:
+            # Wrap into the run at the start of the week, if there is one
+            end = len(self.flat_demand)
+            if len(runs) > 0 and runs[0][0] == 0:
+                end += runs[0][1]
+
+            # Runs that wrap past max length cannot be split at a zero
+            if end < len(self.flat_demand) + self.max_length:
+                runs.append((run_start, end))
+
+        return runs
 
     def _get_flat_demand(self, index):
         """Get flat demand at index - noting that it may be circular!"""
@@ -126,24 +236,92 @@ class Splitter(object):
 
         self._windows.append((start, end))
 
-    def _solve_windows(self):
-        """Run windows through decompose to create shifts"""
+    def _solve_windows(self, deadline):
+        """Run windows through decompose, yielding each window's shifts"""
+        # Windows are solved as they are asked for, so no eager zip()
+        solved = solve_windows(self.window_keys(), deadline)
+        for index, (_, shifts) in enumerate(solved):
+            start, _ = self._windows[index]
+            yield self._add_window_shifts(start, shifts)
+
+    def _add_window_shifts(self, start, shifts):
+        """Move a window's shifts to its start and keep them"""
+        window_shifts = [{
+            "start": shift["start"] + start,
+            "length": shift["length"],
+        } for shift in shifts]
+        self._shifts.extend(window_shifts)
+        return window_shifts
+
+    def _solve_overlapping_windows(self, deadline):
+        """Solve overlapping windows in order, yielding each window's shifts
+
+        Each window is decomposed on the demand that earlier windows left
+        unmet, and only keeps the shifts that start before the next window.
+        The rest are planned again by the next window, which can see past
+        the seam. Every window depends on the last, so they run serially.
+        Stitching is greedy, so a week can end up with more overage than
+        solving it day by day.
+        """
+        week_length = len(self.flat_demand)
+        coverage = [0] * week_length
+        seams = [start for (start, _) in self._windows[1:]]
+        seams.append(self._windows[0][0] + week_length)
+
+        sizes = [
+            sum(self.flat_demand[t % week_length] for t in range(start, stop))
+            for (start, stop) in self._windows
+        ]
+        remaining_size = sum(sizes)
 
         window_count = 0
-        for (start, stop) in self._windows:
+        for (start, stop), seam, size in zip(self._windows, seams, sizes):
             window_count += 1
             logger.info("Starting window %s of %s (start %s stop %s) ",
                         window_count, len(self._windows), start, stop)
 
-            # Need to wrap
-            demand = self._get_window_demand(start, stop)
+            window_deadline = deadline.share(size /
+                                             float(max(remaining_size, 1)))
+            remaining_size -= size
+
+            demand = [
+                max(self.flat_demand[t % week_length] -
+                    coverage[t % week_length], 0) for t in range(start, stop)
+            ]
+            unmet = [t for t in range(len(demand)) if demand[t] > 0]
+            if len(unmet) == 0 or start + unmet[0] >= seam:
+                logger.debug("Nothing left to schedule before seam %s", seam)
+                continue
+
+            # A lone bit of unmet demand still needs a whole shift, and
+            # Decompose needs demand at least min length long
+            if unmet[-1] - unmet[0] + 1 < self.min_length:
+                last = unmet[0] + self.min_length - 1
+                demand[last] = max(demand[last], 1)
+
             d = Decompose(
-                demand, self.min_length, self.max_length, window_offset=start)
+                demand,
+                self.min_length,
+                self.max_length,
+                window_offset=start,
+                deadline=window_deadline)
             d.calculate()
-            e = d.efficiency()
-            logger.info("Window efficiency: Overage is %s percent",
-                        (e * 100.0))
-            self._shifts.extend(d.get_shifts())
+
+            window_shifts = []
+            for shift in d.get_shifts():
+                if shift["start"] >= seam:
+                    continue
+
+                for t in range(shift["start"],
+                               shift["start"] + shift["length"]):
+                    coverage[t % week_length] += 1
+                window_shifts.append({
+                    "start": shift["start"] % week_length,
+                    "length": shift["length"],
+                })
+
+            self._shifts.extend(window_shifts)
+            yield window_shifts
 
     #
     # helper methods
@@ -193,16 +371,15 @@ class Splitter(object):
 
     def validate(self):
         """Check whether shifts meet demand. Used in testing."""
-        expected_demand = copy.copy(self.flat_demand)
-        sum_demand = [0] * len(self.flat_demand)
+        expected_demand = self.flat_demand
 
         logger.debug("Starting validation of %s shifts", len(self._shifts))
 
-        for shift in self._shifts:
-            # Inclusive range
-            for t in range(shift["start"], shift["start"] + shift["length"]):
-                # (circular)
-                sum_demand[(t + 1) % len(self.flat_demand) - 1] += 1
+        # Shifts wrap around the end of the week
+        sum_demand = get_coverage(
+            [(shift["start"], shift["length"]) for shift in self._shifts],
+            len(self.flat_demand),
+            circular=True)
 
         logger.debug("Expected demand: %s", expected_demand)
         logger.debug("Scheduled supply: %s", sum_demand)
@@ -234,3 +411,101 @@ class Splitter(object):
             return self.flat_demand[start:stop]
         return self.flat_demand[start:] + self.flat_demand[:stop % len(
             self.flat_demand)]
+
+
+def solve_windows(keys, deadline, reserved_size=0):
+    """Solve windows by key, yielding (key, shifts) in the order of keys
+
+    Keys are (min_length, max_length, demand) as from
+    Splitter.window_keys(), and windows with the same key (e.g. every
+    weekday) are solved once. Cached windows are found in one round trip
+    and the rest are decomposed, WINDOW_PROCESSES at a time. Each gets a
+    share of the time left by its demand, keeping reserved_size of demand's
+    worth for the caller to use afterwards. Shifts are relative to the
+    window start.
+    """
+    solutions, problems = _get_cached_windows(keys)
+    sizes = OrderedDict((key, sum(key[2])) for key in problems)
+
+    logger.info("Solving %s distinct windows of %s (%s cached)",
+                len(sizes), len(keys), len(solutions))
+    remaining_size = sum(sizes.values()) + reserved_size
+
+    if config.WINDOW_PROCESSES > 1 and len(sizes) > 1:
+        # Windows run WINDOW_PROCESSES at a time
+        total_size = float(max(remaining_size, 1))
+        logger.info("Solving %s windows with %s processes",
+                    len(sizes), config.WINDOW_PROCESSES)
+        with ProcessPoolExecutor(
+                max_workers=config.WINDOW_PROCESSES) as executor:
+            futures = OrderedDict()
+            for key, size in sizes.items():
+                problem = problems[key]
+                problem.deadline = deadline.share(config.WINDOW_PROCESSES *
+                                                  size / total_size)
+                futures[key] = executor.submit(_solve_window_in_worker,
+                                               problem)
+
+            # Later windows keep solving while earlier ones are used
+            for key in keys:
+                if key not in solutions:
+                    solutions[key] = futures[key].result()
+                yield key, solutions[key]
+        return
+
+    # Time that earlier windows did not use goes to later ones
+    solved = 0
+    for key in keys:
+        if key not in solutions:
+            solved += 1
+            logger.info("Starting window %s of %s", solved, len(sizes))
+            problem = problems[key]
+            problem.deadline = deadline.share(sizes[key] /
+                                              float(max(remaining_size, 1)))
+            remaining_size -= sizes[key]
+            solutions[key] = _solve_window(problem)
+
+        yield key, solutions[key]
+
+
+def _get_cached_windows(keys):
+    """Look up window keys in one round trip
+
+    Keys are (min_length, max_length, demand) as from window_keys(). Returns
+    shifts relative to the window start for the hits, and a Decompose ready
+    to solve for each distinct miss.
+    """
+    # Decompose only processes demand when it is made, which gives the
+    # demand that its answer is cached under
+    problems = OrderedDict((key, Decompose(list(key[2]), key[0], key[1]))
+                           for key in OrderedDict.fromkeys(keys))
+    cached = cache.get_multi(
+        [problem._get_cache_subproblem() for problem in problems.values()])
+
+    solutions = {}
+    for (key, problem), shifts in zip(problems.items(), cached):
+        if shifts:
+            # Shifts are cached for the processed demand
+            problem._shifts = shifts
+            solutions[key] = problem.get_shifts()
+            del problems[key]
+
+    return solutions, problems
+
+
+def _solve_window(problem):
+    """Decompose a window that missed the cache
+
+    Returns shifts relative to the window start.
+    """
+    problem.calculate(check_cache=False)
+    e = problem.efficiency()
+    logger.info("Window efficiency: Overage is %s percent", (e * 100.0))
+    return problem.get_shifts()
+
+
+def _solve_window_in_worker(problem):
+    """Process pool entry point for _solve_window"""
+    # Windows are already solved in parallel, so each one runs serially
+    init_worker_process()
+    return _solve_window(problem)
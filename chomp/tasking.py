@@ -9,7 +9,7 @@ import iso8601
 from staffjoy import Client, NotFoundException
 
 from chomp.helpers import week_day_range, normalize_to_midnight
-from chomp import config, logger, Splitter
+from chomp import config, logger, cache, Splitter
 
 
 class Tasking():
@@ -88,44 +88,51 @@ class Tasking():
         self._compute_demand()
         self._subtract_existing_shifts_from_demand()
 
-        # Run the  calculation
+        # Run the  calculation, uploading each window's shifts as soon as it
+        # is solved. Later windows keep solving meanwhile only when
+        # WINDOW_PROCESSES is above 1, and upload time does not count against
+        # TASK_TIMEOUT. If this fails part way, the uploaded shifts are
+        # subtracted from demand when it is retried.
         s = Splitter(self.demand,
                      self.sched.data.get("min_shift_length_hour"),
                      self.sched.data.get("max_shift_length_hour"))
-        s.calculate()
-        s.efficiency()
+
+        local_start_time = self._get_local_start_time()
 
         # Naive becuase not yet datetimes
-        naive_shifts = s.get_shifts()
-        logger.info("Starting upload of %s shifts", len(naive_shifts))
+        for shift in s.iter_shifts():
+            self._create_shift(shift, local_start_time)
 
-        local_start_time = self._get_local_start_time()
+        s.efficiency()
+        logger.info("Uploaded %s shifts", len(s.get_shifts()))
+        logger.info("Local cache hits %s misses %s (%s entries)",
+                    cache.local.hits, cache.local.misses, len(cache.local))
 
-        for shift in naive_shifts:
-            # We have to think of daylight savings time here, so we need to
-            # guarantee that we don't have any errors. We do this by overshooting
-            # the timedelta by an extra two hours, then rounding back to midnight.
+    def _create_shift(self, shift, local_start_time):
+        # We have to think of daylight savings time here, so we need to
+        # guarantee that we don't have any errors. We do this by overshooting
+        # the timedelta by an extra two hours, then rounding back to midnight.
 
-            logger.debug("Processing shift %s", shift)
+        logger.debug("Processing shift %s", shift)
 
-            start_day = normalize_to_midnight(
-                deepcopy(local_start_time) + timedelta(days=shift["day"]))
+        start_day = normalize_to_midnight(
+            deepcopy(local_start_time) + timedelta(days=shift["day"]))
 
-            # Beware of time changes - duplicate times are possible
-            try:
-                start = start_day.replace(hour=shift["start"])
-            except pytz.AmbiguousTimeError:
-                # Randomly pick one. Minor tech debt.
-                start = start_day.replace(hour=shift["start"], is_dst=False)
+        # Beware of time changes - duplicate times are possible
+        try:
+            start = start_day.replace(hour=shift["start"])
+        except pytz.AmbiguousTimeError:
+            # Randomly pick one. Minor tech debt.
+            start = start_day.replace(hour=shift["start"], is_dst=False)
 
-            stop = start + timedelta(hours=shift["length"])
+        stop = start + timedelta(hours=shift["length"])
 
-            # Convert to the strings we are passing up to the cLoUd
-            utc_start_str = start.astimezone(self.default_tz).isoformat()
-            utc_stop_str = stop.astimezone(self.default_tz).isoformat()
+        # Convert to the strings we are passing up to the cLoUd
+        utc_start_str = start.astimezone(self.default_tz).isoformat()
+        utc_stop_str = stop.astimezone(self.default_tz).isoformat()
 
-            logger.info("Creating shift with start %s stop %s", start, stop)
-            self.role.create_shift(start=utc_start_str, stop=utc_stop_str)
+        logger.info("Creating shift with start %s stop %s", start, stop)
+        self.role.create_shift(start=utc_start_str, stop=utc_stop_str)
 
     def _subtract_existing_shifts_from_demand(self):
         logger.info("Starting demand: %s", self.demand)
@@ -0,0 +1,41 @@
+from collections import OrderedDict
+
+
+class TranspositionTable(object):
+    """Bounded memory of the best coverage seen for each search state
+
+    Different orders of shifts often reach the same state, i.e. the same
+    first unmet time and the same demand minus coverage after it. Future
+    shifts only depend on that state, so a repeat with no less coverage than
+    a previous visit cannot lead to a better solution.
+
+    States are keyed by a fixed size digest from get_state_key(), so each
+    entry takes the same memory however long the demand is. The least
+    recently used state is evicted once max_size states are stored.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._table = OrderedDict()
+        self.hits = 0
+
+    def __len__(self):
+        return len(self._table)
+
+    def is_dominated(self, key, coverage):
+        """Record a visit and return whether a previous one was as good"""
+        if self.max_size <= 0:
+            return False
+
+        best_coverage = self._table.pop(key, None)
+        if best_coverage is not None and best_coverage <= coverage:
+            # Re-insert to mark it as recently used
+            self._table[key] = best_coverage
+            self.hits += 1
+            return True
+
+        self._table[key] = coverage
+        if len(self._table) > self.max_size:
+            self._table.popitem(last=False)
+
+        return False
@@ -0,0 +1,96 @@
+from chomp import logger, cache, config
+from chomp.coverage import get_coverage
+
+
+def find_warm_start(decompose):
+    """Adapt a cached solution of a similar demand into a feasible collection
+
+    Candidates are cached solutions with the same shift lengths and demand
+    length. Only those that cover the demand everywhere, or that differ from
+    it by at most WARM_START_DISTANCE of its sum, are adapted. Returns the
+    best adapted collection, or None.
+    """
+    demand = decompose.demand
+    demand_sum = sum(demand)
+    max_distance = config.WARM_START_DISTANCE * demand_sum
+
+    best = None
+    for solved_demand, shifts in cache.get_solutions(
+            config.WARM_START_SOLUTIONS, **_get_family(decompose)):
+        dominates = True
+        distance = 0
+        for solved, wanted in zip(solved_demand, demand):
+            dominates = dominates and solved >= wanted
+            distance += abs(solved - wanted)
+        if not dominates and distance > max_distance:
+            continue
+
+        collection = decompose._new_collection(
+            shifts=_adapt_shifts(demand, shifts, decompose.min_length))
+        if best is None or collection.coverage_sum < best.coverage_sum:
+            best = collection
+
+    if best is not None:
+        logger.debug("Warm start found with coverage %s", best.coverage_sum)
+    return best
+
+
+def record_warm_start(decompose, shifts):
+    """Remember a solution so that similar demands can start from it"""
+    cache.add_solution(
+        list(decompose.demand), [tuple(shift) for shift in shifts],
+        config.WARM_START_SOLUTIONS, **_get_family(decompose))
+
+
+def _get_family(decompose):
+    """Solutions are only reusable between problems with the same shape"""
+    return {
+        "min_length": decompose.min_length,
+        "max_length": decompose.max_length,
+        "demand_length": len(decompose.demand),
+    }
+
+
+def _adapt_shifts(demand, shifts, min_length):
+    """Turn shifts for another demand into shifts that meet this one
+
+    Shifts that are not needed anywhere are dropped, longest first. Times
+    that are still short get min length shifts, as in the heuristic. Last,
+    shifts are trimmed at either end where they are only overage.
+    """
+    demand_length = len(demand)
+    coverage = get_coverage(shifts, demand_length)
+
+    kept = []
+    for start, length in sorted(shifts, key=lambda shift: -shift[1]):
+        end = start + length
+        if all(coverage[t] > demand[t] for t in range(start, end)):
+            for t in range(start, end):
+                coverage[t] -= 1
+        else:
+            kept.append((start, length))
+
+    for t in range(demand_length):
+        missing = demand[t] - coverage[t]
+        if missing <= 0:
+            continue
+
+        start = min(t, demand_length - min_length)
+        kept.extend([(start, min_length)] * missing)
+        for covered in range(start, start + min_length):
+            coverage[covered] += missing
+
+    trimmed = []
+    for start, length in kept:
+        while length > min_length and coverage[start] > demand[start]:
+            coverage[start] -= 1
+            start += 1
+            length -= 1
+        end = start + length
+        while length > min_length and coverage[end - 1] > demand[end - 1]:
+            coverage[end - 1] -= 1
+            end -= 1
+            length -= 1
+        trimmed.append((start, length))
+
+    return trimmed
@@ -1,11 +1,36 @@
+import random
+import time
+
 import pytest
 
-from chomp import Splitter, cache
+from chomp import Splitter, cache, config, logger
 
 EFFICIENCY_LIMIT = .8
 PERFECT_OPTIMALITY = 0.0
 
 
+class ReadCountingList(list):
+    """List that counts how many of its items are read"""
+
+    def __init__(self, items):
+        super(ReadCountingList, self).__init__(items)
+        self.reads = 0
+
+    def __iter__(self):
+        for item in super(ReadCountingList, self).__iter__():
+            self.reads += 1
+            yield item
+
+    def __getitem__(self, index):
+        items = super(ReadCountingList, self).__getitem__(index)
+        self.reads += len(items) if isinstance(index, slice) else 1
+        return items
+
+    def __getslice__(self, start, stop):
+        # Python 2 slices lists without calling __getitem__
+        return self.__getitem__(slice(start, stop))
+
+
 class TestSplitter():
     def setup_method(self, method):
         cache.flush()
@@ -157,6 +182,68 @@ class TestSplitter():
         s.calculate()
         s.validate()
 
+    def test_window_generation_scales_linearly(self):
+        """Benchmark windowing on 5 minute slots over a week and two months"""
+        # Open 8am to 10pm, with demand dipping to zero over lunch
+        day = [0] * 96 + [2] * 48 + [0] * 3 + [3] * 117 + [0] * 24
+        min_length = 36  # 3 hours
+        max_length = 96  # 8 hours
+
+        reads = []
+        for days in [7, 56]:
+            s = Splitter([day] * days, min_length, max_length)
+            s.flat_demand = ReadCountingList(s.flat_demand)
+            start = time.time()
+            s._generate_windows()
+            elapsed = time.time() - start
+            assert len(s._windows) == 2 * days
+            reads.append(s.flat_demand.reads)
+            logger.info("Generated windows for %s days in %.4f seconds with "
+                        "%s reads of demand", days, elapsed,
+                        s.flat_demand.reads)
+
+        # 8 times the horizon should read each slot as often. Timings are
+        # only logged, since they vary too much from run to run.
+        assert reads[1] <= 8 * reads[0]
+
+    def test_overlapping_windows_benchmark(self, monkeypatch):
+        """Compare solve time and overage of 24/7 window modes"""
+        # Random weeks, with demand kept low so both modes solve in seconds
+        random.seed(14)
+        weeks = [[[random.randint(1, 3) for _ in range(24)] for _ in range(7)]
+                 for _ in range(10)]
+        min_length = 4
+        max_length = 8
+
+        overages = {}
+        for mode in ["day", "overlapping"]:
+            monkeypatch.setattr(config, "ALWAYS_OPEN_WINDOWS", mode)
+            overages[mode] = []
+            start = time.time()
+            for demand in weeks:
+                cache.flush()
+                s = Splitter(demand, min_length, max_length)
+                s.calculate()
+                s.validate()
+                overages[mode].append(s.efficiency())
+
+            elapsed = time.time() - start
+            logger.info("%s windows took %.2f seconds a week with %.2f "
+                        "percent overage on average", mode, elapsed /
+                        len(weeks), 100.0 * sum(overages[mode]) / len(weeks))
+
+        worse = [
+            overlapping > day
+            for day, overlapping in zip(overages["day"], overages[
+                "overlapping"])
+        ]
+        logger.info("Overlapping windows had more overage in %s of %s weeks",
+                    sum(worse), len(weeks))
+
+        # Stitched seams only beat hard cuts at midnight on average
+        assert sum(overages["overlapping"]) <= sum(overages["day"])
+
+
 # We commented out this test because it's making Travis-ci.org time out. 
 # Yes, it's ironic that the slow test causes failure because it's slow, but in our internal
 # tests the processors were fast enough in CI and prod for an acceptable run time of this
@@ -180,4 +267,4 @@ class TestSplitter():
         s = Splitter(demand, min_length, max_length)
         s.calculate()
         s.validate()
-"""
\ No newline at end of file
+"""
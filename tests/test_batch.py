@@ -0,0 +1,52 @@
+from chomp import Decompose, Splitter, cache, config, solve_batch, \
+    splitter
+
+
+class TestBatch():
+    def setup_method(self, method):
+        cache.flush()
+        self.problems = [
+            ([[1, 2, 3, 0], [1, 3, 1, 0], [1, 1, 1, 0]], 3, 4),
+            ([[0, 1, 3, 1], [0, 1, 2, 3], [0, 0, 0, 0]], 3, 4),
+            ([[1, 2, 3, 0], [1, 1, 1, 0]], 3, 4),
+        ]
+
+    def teardown_method(self, method):
+        cache.flush()
+
+    def test_matches_separate_splitters(self, monkeypatch):
+        monkeypatch.setattr(config, "WINDOW_PROCESSES", 1)
+
+        expected = []
+        for week_demand, min_length, max_length in self.problems:
+            s = Splitter(week_demand, min_length, max_length)
+            s.calculate()
+            expected.append(s.get_shifts())
+        cache.flush()
+
+        results = solve_batch(self.problems)
+
+        assert len(results) == len(self.problems)
+        for s, shifts in zip(results, expected):
+            s.validate()
+            assert s.get_shifts() == shifts
+
+    def test_identical_windows_solved_once(self, monkeypatch):
+        monkeypatch.setattr(config, "WINDOW_PROCESSES", 1)
+
+        solved = []
+        original_solve_window = splitter._solve_window
+
+        def counting_solve_window(problem):
+            solved.append(problem.demand)
+            return original_solve_window(problem)
+
+        monkeypatch.setattr(splitter, "_solve_window", counting_solve_window)
+
+        solve_batch(self.problems)
+
+        # Seven windows across the batch, but only three distinct demands
+        assert solved == [
+            Decompose(demand, 3, 4).demand
+            for demand in [[1, 2, 3], [1, 3, 1], [1, 1, 1]]
+        ]
@@ -0,0 +1,38 @@
+from chomp.bounds import committed_overage_bound, min_length_run_bound
+from chomp.shift_collection import ShiftCollection
+
+
+class TestBounds():
+    def setup_method(self, method):
+        self.demand = [1, 1, 1, 1, 2, 1, 1, 1]
+        self.demand_sum = sum(self.demand)
+        self.collection = ShiftCollection(3, 8, demand=self.demand)
+
+    def teardown_method(self, method):
+        pass
+
+    def test_empty_collection(self):
+        assert committed_overage_bound(self.collection) == self.demand_sum
+        assert min_length_run_bound(self.collection) == self.demand_sum
+
+    def test_isolated_spike_forces_overage(self):
+        self.collection.add_shift((0, 8))
+
+        assert committed_overage_bound(self.collection) == self.demand_sum
+        # A shift starting at the spike covers two more met hours
+        assert min_length_run_bound(self.collection) == self.demand_sum + 2
+
+    def test_met_demand_uses_committed_overage(self):
+        self.collection.add_shift((0, 8))
+        self.collection.add_shift((2, 3))
+
+        assert self.collection.demand_is_met
+        assert min_length_run_bound(
+            self.collection) == committed_overage_bound(self.collection)
+
+    def test_unreachable_demand_is_infinite(self):
+        demand = [1, 1, 1, 1, 1, 1, 1, 2]
+        collection = ShiftCollection(3, 8, demand=demand)
+        collection.add_shift((0, 8))
+
+        assert min_length_run_bound(collection) == float("inf")
@@ -1,4 +1,6 @@
-from chomp import cache
+from chomp import Decompose, cache, config
+from chomp.cache import LocalCache, SHIFTS_VERSION, decode_shifts, \
+    encode_shifts
 
 
 class TestCache():
@@ -46,3 +48,253 @@ class TestCache():
             demand=demand.append(1),
             min_length=min_length,
             max_length=max_length, ) is None
+
+    def test_get_multi(self):
+        demo_shifts = [{"start": 1, "length": 2}, {"start": 3, "length": 4}]
+        subproblems = [
+            {
+                "demand": [1, 2, 3, 2, 1],
+                "min_length": 1,
+                "max_length": 2
+            },
+            {
+                "demand": [1, 2, 1],
+                "min_length": 1,
+                "max_length": 2
+            },
+        ]
+
+        self.cache.set(shifts=demo_shifts, **subproblems[1])
+
+        assert self.cache.get_multi(subproblems) == [None, demo_shifts]
+
+    def test_local_tier_returns_copies(self):
+        demo_shifts = [{"start": 1, "length": 2}]
+        self.cache.set(
+            demand=[1, 2, 1], min_length=1, max_length=2, shifts=demo_shifts)
+
+        shifts = self.cache.get(demand=[1, 2, 1], min_length=1, max_length=2)
+        shifts[0]["start"] = 0
+        shifts.append({"start": 2, "length": 1})
+
+        assert self.cache.get(
+            demand=[1, 2, 1], min_length=1, max_length=2) == demo_shifts
+
+    def test_mirrored_demand_shares_entry(self, monkeypatch):
+        monkeypatch.setattr(config, "MIRROR_CACHE_KEYS", True)
+        shifts = [{"start": 0, "length": 3}, {"start": 2, "length": 2}]
+        self.cache.set(
+            demand=[1, 1, 2, 2], min_length=2, max_length=3, shifts=shifts)
+
+        assert self.cache.get(
+            demand=[2, 2, 1, 1], min_length=2, max_length=3) == [{
+                "start": 1,
+                "length": 3
+            }, {
+                "start": 0,
+                "length": 2
+            }]
+        assert self.cache.get_multi([{
+            "demand": [1, 1, 2, 2],
+            "min_length": 2,
+            "max_length": 3
+        }, {
+            "demand": [2, 2, 1, 1],
+            "min_length": 2,
+            "max_length": 2
+        }]) == [shifts, None]
+
+    def test_mirrored_window_hits_cache(self, monkeypatch):
+        monkeypatch.setattr(config, "MIRROR_CACHE_KEYS", True)
+        monkeypatch.setattr(config, "THREADS", 1)
+        demand = [1, 2, 3, 3, 4, 2, 2, 1, 1]
+
+        d = Decompose(demand, 2, 4)
+        d.calculate()
+
+        monkeypatch.setattr(Decompose, "_calculate", None)
+        mirrored = Decompose(demand[::-1], 2, 4)
+        mirrored.calculate()
+        mirrored.validate()
+        assert mirrored.efficiency() == d.efficiency()
+
+    def test_set_multi(self):
+        solutions = [
+            ({
+                "demand": [1, 2, 2],
+                "min_length": 1,
+                "max_length": 2
+            }, [{
+                "start": 0,
+                "length": 2
+            }, {
+                "start": 1,
+                "length": 2
+            }]),
+            ({
+                "demand": [2, 2, 1],
+                "min_length": 2,
+                "max_length": 2
+            }, [{
+                "start": 0,
+                "length": 2
+            }, {
+                "start": 0,
+                "length": 2
+            }, {
+                "start": 1,
+                "length": 2
+            }]),
+        ]
+
+        self.cache.set_multi(solutions)
+
+        assert self.cache.get_multi(
+            [subproblem for subproblem, _ in solutions]) == [
+                shifts for _, shifts in solutions
+            ]
+
+    def test_deferred_writes(self, monkeypatch):
+        written = []
+        monkeypatch.setattr(self.cache.backend, "set_multi",
+                            lambda values: written.append(dict(values)))
+        demo_shifts = [{"start": 0, "length": 2}]
+
+        with self.cache.deferred_writes():
+            with self.cache.deferred_writes():
+                self.cache.set(
+                    demand=[1, 1],
+                    min_length=2,
+                    max_length=2,
+                    shifts=demo_shifts)
+            self.cache.set_multi([({
+                "demand": [1, 1, 1],
+                "min_length": 3,
+                "max_length": 3
+            }, [{
+                "start": 0,
+                "length": 3
+            }])])
+
+            # Reads in this process already see them
+            assert written == []
+            assert self.cache.get(
+                demand=[1, 1], min_length=2, max_length=2) == demo_shifts
+
+        assert len(written) == 1
+        assert len(written[0]) == 2
+
+    def test_solutions_are_read_once_per_family(self, monkeypatch):
+        reads = []
+        monkeypatch.setattr(self.cache.backend, "get_multi",
+                            lambda keys: reads.append(keys) or {})
+        monkeypatch.setattr(self.cache.backend, "set", lambda key, value: None)
+        family = {"min_length": 2, "max_length": 3, "demand_length": 4}
+
+        assert self.cache.get_solutions(20, **family) == []
+        self.cache.add_solution([1, 2, 2, 1], [(0, 2), (1, 3)], 20, **family)
+        assert self.cache.get_solutions(20, **family) == [([1, 2, 2, 1],
+                                                           [(0, 2), (1, 3)])]
+        assert len(reads) == 1
+
+    def test_deferred_writes_survive_local_eviction(self, monkeypatch):
+        monkeypatch.setattr(self.cache.backend, "set_multi",
+                            lambda values: None)
+        subproblem = {"demand": [1, 1], "min_length": 2, "max_length": 2}
+        demo_shifts = [{"start": 0, "length": 2}]
+
+        with self.cache.deferred_writes():
+            self.cache.set(shifts=demo_shifts, **subproblem)
+            self.cache.local.clear()
+
+            # Batched and single reads both find the deferred write
+            assert self.cache.get_multi([subproblem]) == [demo_shifts]
+            assert self.cache.get(**subproblem) == demo_shifts
+
+
+class TestShiftEncoding():
+    def setup_method(self, method):
+        self.shifts = [
+            {
+                "start": 0,
+                "length": 4
+            },
+            {
+                "start": 0,
+                "length": 4
+            },
+            {
+                "start": 3,
+                "length": 5
+            },
+            {
+                "start": 0,
+                "length": 4
+            },
+        ]
+
+    def teardown_method(self, method):
+        pass
+
+    def test_round_trip_keeps_order(self):
+        data = encode_shifts(self.shifts, 256)
+
+        assert decode_shifts(data) == self.shifts
+        # Three runs of identical shifts, at six bytes each
+        assert len(data) == 6 + 3 * 6
+
+    def test_large_values_and_compression(self):
+        shifts = [{"start": 70000, "length": 8}] * 500 + self.shifts
+
+        data = encode_shifts(shifts, 16)
+
+        assert decode_shifts(data) == shifts
+        assert len(data) < 6 + 5 * 12
+
+    def test_other_versions_miss(self):
+        data = encode_shifts(self.shifts, 256)
+        newer = chr(SHIFTS_VERSION + 1) + data[1:]
+
+        assert decode_shifts(newer) is None
+        # Entries cached before encoding are still read
+        assert decode_shifts(self.shifts) == self.shifts
+
+
+class TestLocalCache():
+    def setup_method(self, method):
+        self.local = LocalCache(2, 1024)
+
+    def teardown_method(self, method):
+        pass
+
+    def test_counts_hits_and_misses(self):
+        self.local.set("a", [1])
+
+        assert self.local.get("a") == [1]
+        assert self.local.get("b") is None
+        assert self.local.hits == 1
+        assert self.local.misses == 1
+
+    def test_evicts_least_recently_used_entry(self):
+        self.local.set("a", [1])
+        self.local.set("b", [2])
+        self.local.get("a")
+        self.local.set("c", [3])
+
+        assert len(self.local) == 2
+        assert self.local.get("b") is None
+        assert self.local.get("a") == [1]
+        assert self.local.get("c") == [3]
+
+    def test_evicts_to_stay_under_size(self):
+        self.local = LocalCache(10, 1024)
+        self.local.set("a", "x" * 600)
+        self.local.set("b", "y" * 600)
+
+        assert self.local.get("a") is None
+        assert self.local.get("b") == "y" * 600
+        assert self.local.size <= 1024
+
+        # Too big to keep at all
+        self.local.set("c", "z" * 2048)
+        assert self.local.get("c") is None
@@ -0,0 +1,182 @@
+import multiprocessing
+import os
+import sqlite3
+
+from chomp import config, logger
+from chomp.cache import Cache
+from chomp.cache_backends import SqliteBackend
+
+
+class SqliteConfig(config):
+    CACHE_BACKEND = "sqlite"
+
+
+def _set_in_process(args):
+    key, value = args
+    SqliteBackend(SqliteConfig).set(key, value)
+
+
+class TestSqliteBackend():
+    def setup_method(self, method):
+        pass
+
+    def teardown_method(self, method):
+        pass
+
+    def get_backend(self, tmpdir, max_bytes=1024 * 1024, touch_seconds=0):
+        SqliteConfig.SQLITE_CACHE_PATH = os.path.join(
+            str(tmpdir), "cache", "chomp.sqlite")
+        SqliteConfig.SQLITE_CACHE_BYTES = max_bytes
+        SqliteConfig.SQLITE_CACHE_TOUCH_SECONDS = touch_seconds
+        return SqliteBackend(SqliteConfig)
+
+    def test_get_and_set(self, tmpdir):
+        backend = self.get_backend(tmpdir)
+
+        assert backend.get("a") is None
+        backend.set("a", [{"start": 1, "length": 2}])
+        backend.set("b", "packed")
+        backend.set("b", "packed again")
+
+        assert backend.get("a") == [{"start": 1, "length": 2}]
+        assert backend.get_multi(["a", "b", "c"]) == {
+            "a": [{
+                "start": 1,
+                "length": 2
+            }],
+            "b": "packed again",
+        }
+
+        backend.flush()
+        assert backend.get_multi(["a", "b"]) == {}
+
+    def test_survives_restart(self, tmpdir):
+        backend = self.get_backend(tmpdir)
+        backend.set("a", "shifts")
+        backend.disconnect()
+
+        assert self.get_backend(tmpdir).get("a") == "shifts"
+
+    def test_shared_between_processes(self, tmpdir):
+        backend = self.get_backend(tmpdir)
+        backend.set("a", 0)
+
+        pool = multiprocessing.Pool(3)
+        try:
+            pool.map(_set_in_process, [("key%s" % i, i) for i in range(12)])
+        finally:
+            pool.close()
+            pool.join()
+
+        found = backend.get_multi(["key%s" % i for i in range(12)])
+        assert found == dict(("key%s" % i, i) for i in range(12))
+
+    def test_evicts_least_recently_used(self, tmpdir):
+        backend = self.get_backend(tmpdir, max_bytes=2500)
+        for i in range(4):
+            backend.set("key%s" % i, "x" * 500)
+        # Reading an entry keeps it
+        backend.get("key0")
+        backend.set("key4", "x" * 500)
+        backend.set("key5", "x" * 500)
+
+        found = backend.get_multi(["key%s" % i for i in range(6)])
+        assert "key0" in found
+        assert "key1" not in found
+        assert "key5" in found
+        assert len(found) * 500 <= 2500
+
+    def test_recent_reads_are_not_written(self, tmpdir):
+        backend = self.get_backend(tmpdir, touch_seconds=60)
+        backend.set("a", "shifts")
+        writes = backend._connect().total_changes
+
+        assert backend.get("a") == "shifts"
+        assert backend._connect().total_changes == writes
+
+    def test_locked_database_is_a_miss(self, tmpdir):
+        backend = self.get_backend(tmpdir)
+        backend.set("a", "shifts")
+
+        writer = sqlite3.connect(SqliteConfig.SQLITE_CACHE_PATH)
+        writer.execute("BEGIN IMMEDIATE")
+        try:
+            # Reads still work, and are recorded once the lock is free
+            assert backend.get("a") == "shifts"
+            assert backend._touched == set(["a"])
+
+            # A new connection cannot set up the database
+            locked = SqliteBackend(SqliteConfig)
+            locked.TIMEOUT = 0.1
+            assert locked.get("a") is None
+        finally:
+            writer.rollback()
+            writer.close()
+
+        backend.set("b", "more shifts")
+        assert backend._touched == set()
+
+    def test_unwritable_path_is_ignored(self, tmpdir):
+        self.get_backend(tmpdir)
+        # The cache directory cannot be made inside a file
+        blocker = tmpdir.join("cache")
+        blocker.write("")
+
+        backend = SqliteBackend(SqliteConfig)
+        backend.set("a", "shifts")
+        assert backend.get("a") is None
+        backend.flush()
+
+        # Schedules that were solved are still returned
+        c = Cache(SqliteConfig, logger)
+        with c.deferred_writes():
+            c.set(
+                demand=[1, 1, 2, 2, 1],
+                min_length=3,
+                max_length=4,
+                shifts=[{
+                    "start": 0,
+                    "length": 4
+                }])
+
+    def test_cache_uses_backend(self, tmpdir):
+        self.get_backend(tmpdir)
+        shifts = [{"start": 0, "length": 4}, {"start": 2, "length": 3}]
+
+        c = Cache(SqliteConfig, logger)
+        c.set(
+            demand=[1, 1, 2, 2, 1], min_length=3, max_length=4, shifts=shifts)
+
+        # A new process starts with an empty local tier
+        restarted = Cache(SqliteConfig, logger)
+        assert restarted.get(
+            demand=[1, 1, 2, 2, 1], min_length=3, max_length=4) == shifts
+        assert restarted.local.misses == 1
+
+    def test_solutions_shared_between_processes(self, tmpdir):
+        self.get_backend(tmpdir)
+        family = {"min_length": 2, "max_length": 3, "demand_length": 4}
+
+        first = Cache(SqliteConfig, logger)
+        second = Cache(SqliteConfig, logger)
+        assert first.get_solutions(20, **family) == []
+
+        # Each process adds without reading, so neither loses the other's
+        first.add_solution([1, 2, 2, 1], [(0, 2), (1, 3)], 20, **family)
+        second.add_solution([1, 1, 2, 2], [(0, 2), (2, 2)], 20, **family)
+        second.add_solution([1, 2, 2, 1], [(0, 3), (1, 3)], 20, **family)
+
+        # Each keeps what it read or added, and a new process sees both
+        assert first.get_solutions(20, **family) == [([1, 2, 2, 1],
+                                                      [(0, 2), (1, 3)])]
+        restarted = Cache(SqliteConfig, logger)
+        assert sorted(restarted.get_solutions(20, **family)) == [
+            ([1, 1, 2, 2], [(0, 2), (2, 2)]),
+            ([1, 2, 2, 1], [(0, 3), (1, 3)]),
+        ]
+
+        # With one slot, the latest solution replaces the last
+        first.add_solution([1, 1, 1, 1], [(0, 2), (2, 2)], 1, **family)
+        second.add_solution([3, 3, 3, 3], [(0, 2), (2, 2)] * 3, 1, **family)
+        assert first.get_solutions(1, **family) == [([3, 3, 3, 3],
+                                                     [(0, 2), (2, 2)] * 3)]
@@ -0,0 +1,39 @@
+import pytest
+
+from chomp import config
+from chomp.coverage import get_coverage
+
+
+class TestCoverage():
+    def setup_method(self, method):
+        self.shifts = [(0, 3), (1, 2), (2, 4), (5, 1)]
+
+    def teardown_method(self, method):
+        pass
+
+    def test_coverage(self):
+        assert get_coverage(self.shifts, 6) == [1, 2, 3, 1, 1, 2]
+        assert get_coverage([], 3) == [0, 0, 0]
+
+    def test_outside_demand_raises(self):
+        with pytest.raises(Exception):
+            get_coverage([(4, 3)], 6)
+
+        with pytest.raises(Exception):
+            get_coverage([(-1, 2)], 6)
+
+    def test_circular_coverage_wraps(self):
+        assert get_coverage([(4, 4)], 6, circular=True) == [1, 1, 0, 0, 1, 1]
+        assert get_coverage([(7, 2)], 6, circular=True) == [0, 1, 1, 0, 0, 0]
+
+        # Longer than demand covers everything at least once
+        assert get_coverage([(1, 8)], 6, circular=True) == [1, 2, 2, 1, 1, 1]
+
+    def test_numpy_matches_python(self, monkeypatch):
+        pytest.importorskip("numpy")
+        shifts = self.shifts + [(4, 5), (3, 9)]
+        expected = get_coverage(shifts, 6, circular=True)
+
+        monkeypatch.setattr(config, "COVERAGE_KERNEL", "numpy")
+        assert get_coverage(shifts, 6, circular=True) == expected
+        assert get_coverage(self.shifts, 6) == [1, 2, 3, 1, 1, 2]
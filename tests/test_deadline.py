@@ -0,0 +1,39 @@
+import time
+
+from chomp.deadline import Deadline
+
+
+class TestDeadline():
+    def setup_method(self, method):
+        pass
+
+    def teardown_method(self, method):
+        pass
+
+    def test_remaining_and_expired(self):
+        deadline = Deadline(60)
+        assert not deadline.expired()
+        assert 59 < deadline.remaining() <= 60
+
+        expired = Deadline(0)
+        assert expired.expired()
+        assert expired.remaining() == 0.0
+
+    def test_shares_never_outlast_parent(self):
+        deadline = Deadline(60)
+
+        half = deadline.share(0.5)
+        assert 29 < half.remaining() <= 30
+
+        # Fractions above one are clipped to what is left
+        assert deadline.share(3).expires_at == deadline.expires_at
+
+        assert deadline.cap(10).remaining() <= 10
+        assert deadline.cap(600).expires_at == deadline.expires_at
+
+    def test_paused_time_is_not_counted(self):
+        deadline = Deadline(60)
+        expires_at = deadline.expires_at
+        with deadline.paused():
+            time.sleep(0.05)
+        assert deadline.expires_at >= expires_at + 0.05
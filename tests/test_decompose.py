@@ -1,4 +1,7 @@
-from chomp import Decompose, cache
+import pytest
+
+from chomp import Decompose, cache, config, decompose
+from chomp.deadline import Deadline
 
 
 class TestDecompose():
@@ -92,3 +95,262 @@ class TestDecompose():
         expected_demand = [3, 3, 3, 2, 4, 3, 3, 3, 3]
         d = Decompose(demand, min_length, max_length)
         assert d.demand == expected_demand
+
+    # yapf: disable
+    @pytest.mark.parametrize("settings, demand, min_length, max_length, "
+                             "same_shifts", [
+        # Deep backtracking, so every rollback must undo its shift exactly
+        ({"SEARCH_MODE": "in_place"},
+         [1, 3, 4, 4, 1, 4, 1, 2, 3, 4], 2, 5, True),
+        # Many optimal solutions tie, so only coverage must match
+        ({"SEARCH_MODE": "best_first"},
+         [2, 2, 2, 2, 2, 2, 2, 2, 2], 2, 4, False),
+        # The min length forces overage that the flow must account for
+        ({"DECOMPOSE_ENGINE": "min_cost_flow"},
+         [1, 3, 1, 1, 4, 4, 2, 1, 3], 3, 5, False),
+        # Enough branches near the root to split into subtrees
+        ({"THREADS": 3, "PARALLEL_MIN_DEMAND": 0},
+         [1, 2, 4, 2, 1, 3, 4, 1, 2, 3, 1, 2], 2, 5, True),
+    ])
+    # yapf: enable
+    def test_search_settings_match_copies(self, monkeypatch, settings, demand,
+                                          min_length, max_length, same_shifts):
+        monkeypatch.setattr(config, "SEARCH_MODE", "copy")
+        monkeypatch.setattr(config, "THREADS", 1)
+
+        expected = Decompose(demand, min_length, max_length)
+        expected._calculate()
+        expected.validate()
+
+        for name, value in settings.items():
+            monkeypatch.setattr(config, name, value)
+        d = Decompose(demand, min_length, max_length)
+        d._calculate()
+        d.validate()
+
+        if same_shifts:
+            assert d.get_shifts() == expected.get_shifts()
+        else:
+            assert (sum(shift["length"] for shift in d.get_shifts()) == sum(
+                shift["length"] for shift in expected.get_shifts()))
+
+    def test_anytime_reports_incumbents(self):
+        demand = [0, 2, 3, 3, 4, 2, 1, 3, 3, 2]
+        min_length = 2
+        max_length = 4
+
+        incumbents = []
+        d = Decompose(demand, min_length, max_length)
+        d.calculate(
+            on_incumbent=lambda shifts, gap: incumbents.append((shifts, gap)))
+
+        assert len(incumbents) > 0
+        gaps = [gap for _, gap in incumbents]
+        assert gaps == sorted(gaps, reverse=True)
+
+        # Shifts are reported with the window offset applied
+        for shifts, _ in incumbents:
+            assert min(shift["start"] for shift in shifts) >= 1
+
+    def test_acceptable_gap_stops_with_heuristic(self):
+        demand = [2, 3, 3, 4, 2, 1, 3, 3, 2]
+        min_length = 2
+        max_length = 4
+
+        incumbents = []
+        d = Decompose(demand, min_length, max_length)
+        d.calculate(
+            acceptable_gap=1.0,
+            on_incumbent=lambda shifts, gap: incumbents.append(gap))
+
+        # Any solution is acceptable, so the heuristic is returned
+        assert len(incumbents) == 1
+        heuristic = d.use_heuristics_to_generate_some_solution()
+        assert sorted((shift["start"], shift["length"])
+                      for shift in d.get_shifts()) == sorted(heuristic.shifts)
+
+    def test_acceptable_gap_is_not_cached(self):
+        demand = [2, 3, 3, 4, 2, 1, 3, 3, 2]
+        min_length = 2
+        max_length = 4
+
+        approximate = Decompose(demand, min_length, max_length)
+        approximate.calculate(acceptable_gap=1.0)
+        assert approximate.stopped_on_gap
+        assert approximate._get_cache() is None
+
+        # A later exact search is not handed the approximate solution
+        exact = Decompose(demand, min_length, max_length)
+        exact.calculate()
+        assert not exact.stopped_on_gap
+        assert exact.efficiency() < approximate.efficiency()
+        assert exact._get_cache() == exact._shifts
+
+    def test_parallel_search_reuses_pool(self, monkeypatch):
+        monkeypatch.setattr(config, "THREADS", 3)
+        monkeypatch.setattr(config, "PARALLEL_MIN_DEMAND", 20)
+        min_length = 2
+        max_length = 5
+
+        # Small problems are searched without starting workers
+        decompose._close_search_pool()
+        Decompose([1, 2, 1, 2, 1, 2], min_length, max_length)._calculate()
+        assert decompose._search_pool is None
+
+        pools = []
+        for demand in [[1, 2, 4, 2, 1, 3, 4, 1, 2, 3, 1, 2],
+                       [2, 1, 3, 4, 2, 1, 2, 4, 3, 1, 2, 1]]:
+            Decompose(demand, min_length, max_length)._calculate()
+            pools.append(decompose._search_pool[2])
+        assert pools[0] is pools[1]
+
+        # Workers would not see a change to the config
+        monkeypatch.setattr(config, "LOWER_BOUND", "committed_overage")
+        Decompose([1, 2, 4, 2, 1, 3, 4, 1, 2, 3, 1, 2], min_length,
+                  max_length)._calculate()
+        assert decompose._search_pool[2] is not pools[0]
+        decompose._close_search_pool()
+
+    def test_split_solves_identical_leaves_once(self, monkeypatch):
+        demand = [4, 8, 8, 8, 8, 4]
+        min_length = 2
+        max_length = 4
+
+        solved = []
+        original_calculate = Decompose._calculate
+
+        def counting_calculate(decompose):
+            solved.append(list(decompose.demand))
+            original_calculate(decompose)
+
+        monkeypatch.setattr(config, "BIFURCATION_THRESHHOLD", 10)
+        monkeypatch.setattr(config, "THREADS", 1)
+        monkeypatch.setattr(Decompose, "_calculate", counting_calculate)
+
+        d = Decompose(demand, min_length, max_length)
+        d.calculate()
+        d.validate()
+
+        # Every value is divisible by 4, so all four leaves are identical
+        assert solved == [[1, 2, 2, 2, 2, 1]]
+        leaf_shifts = sorted((shift["start"], shift["length"])
+                             for shift in d.get_shifts())
+        assert leaf_shifts == sorted(leaf_shifts[::4] * 4)
+        assert sum(shift["length"] for shift in d.get_shifts()) == sum(demand)
+
+    def test_expired_deadline_returns_heuristic(self, monkeypatch):
+        demand = [2, 3, 3, 5, 4, 4, 3, 2, 1, 1]
+        min_length = 2
+        max_length = 5
+
+        monkeypatch.setattr(config, "THREADS", 1)
+
+        d = Decompose(demand, min_length, max_length, deadline=Deadline(0))
+        d.calculate()
+        d.validate()
+
+        # The search stops before its first branch
+        heuristic = d.use_heuristics_to_generate_some_solution()
+        assert sorted((shift["start"], shift["length"])
+                      for shift in d.get_shifts()) == sorted(heuristic.shifts)
+
+    def test_expired_deadline_is_not_cached(self, monkeypatch):
+        demand = [2, 3, 3, 5, 4, 4, 3, 2, 1, 1]
+        min_length = 2
+        max_length = 5
+
+        monkeypatch.setattr(config, "THREADS", 1)
+
+        truncated = Decompose(
+            demand, min_length, max_length, deadline=Deadline(0))
+        truncated.calculate()
+        assert truncated.stopped_early
+        assert truncated._get_cache() is None
+
+        # A later search with time to spare finds a better solution
+        d = Decompose(demand, min_length, max_length)
+        d.calculate()
+        assert not d.stopped_early
+        assert d.efficiency() < truncated.efficiency()
+        assert d._get_cache() == d._shifts
+
+    def test_compressed_demand(self, monkeypatch):
+        # Hourly demand in 15 minute slots, with shifts of 2 to 3 hours
+        hourly = [1, 2, 3, 3, 2, 1]
+        demand = [value for value in hourly for _ in range(4)]
+        min_length = 8
+        max_length = 12
+
+        monkeypatch.setattr(config, "THREADS", 1)
+        monkeypatch.setattr(config, "COMPRESS_DEMAND", True)
+
+        d = Decompose(demand, min_length, max_length)
+        assert d.compression == 4
+        assert d.min_length == 2
+        assert d.max_length == 3
+
+        d.calculate()
+        d.validate()
+
+        expected = Decompose(hourly, 2, 3)
+        expected.calculate()
+        assert d.get_shifts() == [{
+            "start": shift["start"] * 4,
+            "length": shift["length"] * 4,
+        } for shift in expected.get_shifts()]
+
+    def test_compression_branches_at_change_points(self, monkeypatch):
+        monkeypatch.setattr(config, "COMPRESS_DEMAND", True)
+
+        # A run of 3 breaks the 2 slot blocks
+        d = Decompose([1, 1, 2, 2, 2, 1, 1, 1, 1, 1], 2, 5)
+        assert d.compression == 1
+        assert d.min_length == 2
+
+        # Lengths 5 and 2 are the limits, and 3 ends where demand changes
+        assert d._get_branch_lengths(2) == [5, 3, 2]
+        assert d._get_branch_lengths(0) == [5, 2]
+
+    def test_compression_matches_uncompressed(self, monkeypatch):
+        monkeypatch.setattr(config, "THREADS", 1)
+
+        # Hourly demand in 15 minute slots that opens at quarter past, with
+        # one 15 minute spike and shifts of 3 to 6 hours
+        hourly = [2, 4, 5, 7, 6, 5, 3, 4, 6, 7, 5, 4, 3, 2]
+        demand = [0] + [value for value in hourly for _ in range(4)]
+        demand[1] = 1
+        demand[30] += 1
+        min_length = 12
+        max_length = 24
+
+        coverages = []
+        for compress in [False, True]:
+            monkeypatch.setattr(config, "COMPRESS_DEMAND", compress)
+            cache.flush()
+            d = Decompose(demand, min_length, max_length)
+            d.calculate()
+            d.validate()
+            coverages.append(sum(shift["length"] for shift in d.get_shifts()))
+
+        assert coverages[0] == coverages[1]
+
+    def test_heuristic_portfolio_records_winner(self, monkeypatch):
+        demand = [3, 4, 5, 2, 2, 1, 4]
+        min_length = 3
+        max_length = 4
+
+        monkeypatch.setattr(config, "THREADS", 1)
+        monkeypatch.setattr(config, "HEURISTICS", ["min_length_fill"])
+        d = Decompose(demand, min_length, max_length)
+        fill = d.use_heuristics_to_generate_some_solution()
+        assert d.starting_heuristic == "min_length_fill"
+
+        monkeypatch.setattr(config, "HEURISTICS",
+                            ["min_length_fill", "layer_peeling"])
+        d = Decompose(demand, min_length, max_length)
+        d.calculate()
+        d.validate()
+
+        assert d.starting_heuristic == "layer_peeling"
+        assert sum(shift["length"]
+                   for shift in d.get_shifts()) < fill.coverage_sum
@@ -0,0 +1,52 @@
+from chomp.coverage import get_coverage
+from chomp.heuristics import HEURISTICS, layer_dynamic_program, \
+    layer_peeling, longest_shift, min_length_fill
+
+
+class TestHeuristics():
+    def setup_method(self, method):
+        self.demand = [1, 2, 2, 2, 1, 1, 1, 1, 1]
+        self.min_length = 2
+        self.max_length = 4
+
+    def teardown_method(self, method):
+        pass
+
+    def test_every_heuristic_meets_demand(self):
+        problems = [
+            (self.demand, self.min_length, self.max_length),
+            ([3, 4, 5, 4, 4, 4, 4], 3, 4),
+            ([1, 0, 0, 3, 1], 2, 2),
+            ([2, 1, 1, 1, 1, 1, 1, 1, 1], 6, 8),
+        ]
+        for name, heuristic in HEURISTICS.items():
+            for demand, min_length, max_length in problems:
+                shifts = heuristic(demand, min_length, max_length)
+
+                coverage = get_coverage(shifts, len(demand))
+                assert all(covered >= wanted
+                           for covered, wanted in zip(coverage, demand)), name
+                for start, length in shifts:
+                    assert min_length <= length <= max_length
+
+    def test_min_length_fill(self):
+        assert min_length_fill(self.demand, self.min_length,
+                               self.max_length) == [(7, 2), (0, 2), (1, 2),
+                                                    (2, 2), (3, 2), (5, 2)]
+
+    def test_longest_shift(self):
+        assert longest_shift(self.demand, self.min_length,
+                             self.max_length) == [(0, 4), (1, 4), (5, 4)]
+
+    def test_layer_peeling_splits_runs_evenly(self):
+        assert layer_peeling(self.demand, self.min_length,
+                             self.max_length) == [(0, 3), (3, 3), (6, 3),
+                                                  (1, 3)]
+
+    def test_layer_dynamic_program_finds_cheapest_layer(self):
+        demand = [1] * 9
+
+        # Peeling covers the run with a max length shift and then a min
+        # length one, but two min length shifts are cheaper
+        assert layer_peeling(demand, 6, 8) == [(0, 8), (3, 6)]
+        assert layer_dynamic_program(demand, 6, 8) == [(0, 6), (3, 6)]
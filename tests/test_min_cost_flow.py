@@ -0,0 +1,60 @@
+import pytest
+
+from chomp.exceptions import CalculationException
+from chomp.min_cost_flow import MinCostFlow, decompose_with_min_cost_flow
+
+
+def _coverage(shifts, demand_length):
+    coverage = [0] * demand_length
+    for start, length in shifts:
+        for t in range(start, start + length):
+            coverage[t] += 1
+    return coverage
+
+
+def test_min_cost_flow_prefers_cheap_path():
+    flow = MinCostFlow(4)
+    cheap = flow.add_edge(0, 1, 1, 1)
+    flow.add_edge(1, 3, 5, 1)
+    expensive = flow.add_edge(0, 2, 5, 4)
+    flow.add_edge(2, 3, 5, 1)
+
+    assert flow.solve(0, 3, 3) == 2 + 2 * 5
+    assert MinCostFlow.get_flow(cheap) == 1
+    assert MinCostFlow.get_flow(expensive) == 2
+
+
+def test_min_cost_flow_raises_when_infeasible():
+    flow = MinCostFlow(3)
+    flow.add_edge(0, 1, 1, 1)
+    with pytest.raises(CalculationException):
+        flow.solve(0, 2, 1)
+
+
+def test_decompose_flat_demand():
+    assert decompose_with_min_cost_flow([2, 2, 2, 2], 2, 4) == [(0, 4), (0, 4)]
+
+
+def test_decompose_forces_overage_when_lengths_do_not_fit():
+    demand = [1, 1, 1, 1, 1, 1, 1]
+    shifts = decompose_with_min_cost_flow(demand, 3, 3)
+
+    coverage = _coverage(shifts, len(demand))
+    assert all(c >= d for c, d in zip(coverage, demand))
+    # Three shifts of length 3 are the best way to cover 7 times
+    assert sum(length for _, length in shifts) == 9
+
+
+def test_decompose_respects_length_limits():
+    demand = [1, 2, 3, 4, 5, 4, 3, 2, 1]
+    shifts = decompose_with_min_cost_flow(demand, 5, 6)
+
+    coverage = _coverage(shifts, len(demand))
+    assert all(c >= d for c, d in zip(coverage, demand))
+    assert all(5 <= length <= 6 for _, length in shifts)
+    assert sum(length for _, length in shifts) == sum(demand)
+
+
+def test_decompose_raises_on_short_demand():
+    with pytest.raises(CalculationException):
+        decompose_with_min_cost_flow([1, 1], 3, 4)
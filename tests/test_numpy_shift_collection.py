@@ -0,0 +1,95 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from chomp.shift_collection import ShiftCollection
+from chomp.numpy_shift_collection import NumpyShiftCollection
+
+
+class TestNumpyShiftCollection():
+    def setup_method(self, method):
+        self.min_length = 5
+        self.max_length = 6
+        self.demand = [1, 2, 3, 4, 5, 4, 3, 2, 1]
+        self.demand_sum = sum(self.demand)
+        self.collection = NumpyShiftCollection(
+            self.min_length, self.max_length, demand=self.demand)
+        self.reference = ShiftCollection(
+            self.min_length, self.max_length, demand=self.demand)
+
+    def teardown_method(self, method):
+        pass
+
+    def assert_matches_reference(self):
+        assert self.collection.shifts == self.reference.shifts
+        for t in range(len(self.demand)):
+            assert self.collection.get_demand_minus_coverage(
+                t) == self.reference.get_demand_minus_coverage(t)
+
+        assert self.collection.coverage_sum == self.reference.coverage_sum
+        assert self.collection.best_possible_coverage == self.reference.best_possible_coverage
+        assert self.collection.demand_is_met == self.reference.demand_is_met
+        assert self.collection.is_optimal == self.reference.is_optimal
+        if not self.reference.demand_is_met:
+            assert self.collection.get_first_time_demand_not_met(
+            ) == self.reference.get_first_time_demand_not_met()
+
+    def test_init_noshifts(self):
+        self.assert_matches_reference()
+        assert self.collection.best_possible_coverage == self.demand_sum
+        assert self.collection.get_first_time_demand_not_met() == 0
+
+    def test_add_shifts(self):
+        for shift in [(0, 3), (0, 3), (3, 4)]:
+            self.collection.add_shift(shift)
+            self.reference.add_shift(shift)
+            self.assert_matches_reference()
+
+    def test_init_with_shifts(self):
+        shifts = [(0, 5), (1, 6), (3, 6), (3, 5)]
+        self.collection = NumpyShiftCollection(
+            self.min_length,
+            self.max_length,
+            demand=self.demand,
+            shifts=shifts)
+        self.reference = ShiftCollection(
+            self.min_length,
+            self.max_length,
+            demand=self.demand,
+            shifts=shifts)
+        self.assert_matches_reference()
+
+    def test_annealing_and_rollback(self):
+        self.collection.add_shift((0, 5))
+        self.reference.add_shift((0, 5))
+
+        for collection in [self.collection, self.reference]:
+            collection.checkpoint()
+            for shift in [(1, 5), (1, 6), (3, 5), (4, 5)]:
+                collection.add_shift(shift)
+            collection.anneal()
+        self.assert_matches_reference()
+        assert self.collection.is_optimal == True
+
+        self.collection.rollback()
+        self.reference.rollback()
+        self.assert_matches_reference()
+        assert self.collection.shifts == [(0, 5)]
+
+    def test_score_shifts_matches_reference(self):
+        demand = [2, 3, 3, 4, 2, 1, 3, 3, 2]
+        collection = NumpyShiftCollection(2, 4, demand=demand)
+        reference = ShiftCollection(2, 4, demand=demand)
+
+        for shift in [(0, 4), (0, 4), (1, 3), (3, 4), (3, 2)]:
+            start = reference.get_first_time_demand_not_met()
+            lengths = [4, 3, 2]
+            assert collection.score_shifts(
+                start, lengths) == reference.score_shifts(start, lengths)
+
+            collection.add_shift(shift)
+            reference.add_shift(shift)
+
+        # Scoring leaves the collection untouched
+        assert collection.shifts == reference.shifts
+        assert collection.coverage_sum == reference.coverage_sum
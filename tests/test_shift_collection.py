@@ -171,3 +171,68 @@ class TestShiftCollection():
 
         self.collection.anneal()
         assert self.collection._shifts == shifts
+
+    def test_annealing_updates_running_totals(self):
+        shifts = [(0, 5), (1, 5), (1, 6), (3, 5), (4, 5)]
+
+        for shift in shifts:
+            self.collection.add_shift(shift)
+
+        assert self.collection.coverage_sum == self.demand_sum + 1
+        assert self.collection.best_possible_coverage == self.demand_sum + 1
+        assert self.collection.is_optimal == False
+
+        self.collection.anneal()
+        assert self.collection.coverage_sum == self.demand_sum
+        assert self.collection.best_possible_coverage == self.demand_sum
+        assert self.collection.demand_is_met == True
+        assert self.collection.is_optimal == True
+
+    def test_rollback_restores_state(self):
+        self.collection.add_shift((0, 5))
+
+        self.collection.checkpoint()
+        self.collection.add_shift((1, 5))
+        self.collection.checkpoint()
+        self.collection.add_shift((1, 6))
+        self.collection.add_shift((3, 5))
+        self.collection.add_shift((4, 5))
+        self.collection.anneal()
+        assert self.collection.depth == 2
+        assert self.collection.is_optimal == True
+
+        self.collection.rollback()
+        assert self.collection.depth == 1
+        assert self.collection.shifts == [(0, 5), (1, 5)]
+        assert self.collection.coverage_sum == 10
+        assert self.collection.get_first_time_demand_not_met() == 2
+
+        self.collection.rollback()
+        assert self.collection.depth == 0
+        assert self.collection.shifts == [(0, 5)]
+        assert self.collection.coverage_sum == 5
+        assert self.collection.best_possible_coverage == self.demand_sum
+        assert self.collection.get_first_time_demand_not_met() == 1
+        for t in range(len(self.demand)):
+            expected = self.demand[t] - (1 if t < 5 else 0)
+            assert self.collection.get_demand_minus_coverage(t) == expected
+
+    def test_init_with_shifts_matches_adding_them(self):
+        shifts = [(0, 5), (1, 6), (3, 6), (3, 5)]
+        collection = ShiftCollection(
+            self.min_length,
+            self.max_length,
+            demand=self.demand,
+            shifts=shifts)
+        for shift in shifts:
+            self.collection.add_shift(shift)
+
+        assert collection.shifts == self.collection.shifts
+        assert collection.coverage_sum == self.collection.coverage_sum
+        assert (collection.best_possible_coverage ==
+                self.collection.best_possible_coverage)
+        assert (collection.get_first_time_demand_not_met() ==
+                self.collection.get_first_time_demand_not_met())
+        for t in range(len(self.demand)):
+            assert (collection.get_demand_minus_coverage(t) ==
+                    self.collection.get_demand_minus_coverage(t))
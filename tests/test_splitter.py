@@ -1,6 +1,9 @@
+import random
+import time
+
 import pytest
 
-from chomp import Splitter
+from chomp import Decompose, Splitter, cache, config, splitter
 from chomp.exceptions import UnequalDayLengthException
 
 
@@ -170,3 +173,163 @@ class TestDecompose():
         self.week_demand = [[1, 1, 0, 4], [1, 2, 1, 0], [1, 1, 1, 1]]
         s = Splitter(self.week_demand, self.min_length, self.max_length)
         assert s._is_circular_necessary() is True
+
+    def test_parallel_windows_match_serial(self, monkeypatch):
+        results = []
+        for processes in [1, 3]:
+            monkeypatch.setattr(config, "WINDOW_PROCESSES", processes)
+            cache.flush()
+            s = Splitter(self.week_demand, self.min_length, self.max_length)
+            s.calculate()
+            s.validate()
+            results.append(s.get_shifts())
+
+        assert results[0] == results[1]
+
+    def test_identical_windows_solved_once(self, monkeypatch):
+        self.week_demand = [[0, 1, 2, 2, 1, 0]] * 5 + [[0, 2, 2, 2, 0, 0]]
+
+        solved = []
+        original_calculate = Decompose.calculate
+
+        def counting_calculate(decompose, **kwargs):
+            solved.append(list(decompose.demand))
+            original_calculate(decompose, **kwargs)
+
+        monkeypatch.setattr(config, "WINDOW_PROCESSES", 1)
+        monkeypatch.setattr(Decompose, "calculate", counting_calculate)
+        cache.flush()
+
+        s = Splitter(self.week_demand, self.min_length, self.max_length)
+        s.calculate()
+        s.validate()
+
+        # Demand is edge smoothed by Decompose
+        assert solved == [[2, 2, 2, 1], [2, 2, 2]]
+
+        # Each weekday gets its own copy of the same shifts
+        shifts = s.get_shifts()
+        for day in range(5):
+            day_shifts = [(shift["start"], shift["length"]) for shift in shifts
+                          if shift["day"] == day]
+            assert day_shifts == [(shift["start"], shift["length"])
+                                  for shift in shifts if shift["day"] == 0]
+
+    def test_windowing_overlapping(self, monkeypatch):
+        monkeypatch.setattr(config, "ALWAYS_OPEN_WINDOWS", "overlapping")
+        monkeypatch.setattr(config, "OVERLAP_WINDOW_STEP", 0.5)
+        self.week_demand = [[2, 2, 3, 4], [1, 3, 1, 8], [1, 1, 1, 2]]
+        s = Splitter(self.week_demand, self.min_length, self.max_length)
+        s._generate_windows()
+
+        # Starts at the quietest time and wraps around the week
+        expected_windows = [(4, 10), (6, 12), (8, 14), (10, 16), (12, 18),
+                            (14, 20)]
+        assert s._windows == expected_windows
+
+    def test_overlapping_windows_meet_demand(self, monkeypatch):
+        monkeypatch.setattr(config, "ALWAYS_OPEN_WINDOWS", "overlapping")
+        weeks = [[[1, 2, 3, 4, 2, 1], [1, 3, 1, 2, 2, 2], [1, 1, 1, 2, 3, 3]]]
+        generator = random.Random(14)
+        for _ in range(5):
+            weeks.append([[generator.randint(1, 4) for _ in range(6)]
+                          for _ in range(3)])
+
+        for week_demand in weeks:
+            cache.flush()
+            s = Splitter(week_demand, self.min_length, self.max_length)
+            s.calculate()
+            s.validate()
+
+            for shift in s.get_shifts():
+                assert 0 <= shift["day"] < len(week_demand)
+                assert 0 <= shift["start"] < len(week_demand[0])
+
+    def test_iter_shifts_streams_windows(self, monkeypatch):
+        monkeypatch.setattr(config, "WINDOW_PROCESSES", 1)
+        cache.flush()
+
+        solved = []
+        original_solve_window = splitter._solve_window
+
+        def counting_solve_window(problem):
+            solved.append(problem.demand)
+            return original_solve_window(problem)
+
+        monkeypatch.setattr(splitter, "_solve_window", counting_solve_window)
+
+        s = Splitter(self.week_demand, self.min_length, self.max_length)
+        shifts = s.iter_shifts()
+        first = next(shifts)
+
+        # Only the first window has been solved so far
+        assert len(solved) == 1
+        assert len(s._shifts) < sum(self.week_demand[0])
+
+        streamed = [first] + list(shifts)
+        s.validate()
+        assert streamed == s.get_shifts()
+
+    def test_iter_shifts_deadline_excludes_caller(self, monkeypatch):
+        monkeypatch.setattr(config, "WINDOW_PROCESSES", 1)
+        monkeypatch.setattr(config, "TASK_TIMEOUT", 0.5)
+        cache.flush()
+
+        expired = []
+        original_solve_window = splitter._solve_window
+
+        def recording_solve_window(problem):
+            expired.append(problem.deadline.expired())
+            return original_solve_window(problem)
+
+        monkeypatch.setattr(splitter, "_solve_window", recording_solve_window)
+
+        s = Splitter(self.week_demand, self.min_length, self.max_length)
+        for _ in s.iter_shifts():
+            # E.g. uploading shifts
+            time.sleep(0.2)
+
+        assert expired == [False] * 3
+
+    def test_cached_windows_found_in_one_round_trip(self, monkeypatch):
+        monkeypatch.setattr(config, "WINDOW_PROCESSES", 1)
+        cache.flush()
+        s = Splitter(self.week_demand, self.min_length, self.max_length)
+        s.calculate()
+        expected = s.get_shifts()
+
+        lookups = []
+        original_get_multi = cache.get_multi
+
+        def counting_get_multi(subproblems):
+            lookups.append(len(subproblems))
+            return original_get_multi(subproblems)
+
+        monkeypatch.setattr(cache, "get_multi", counting_get_multi)
+        monkeypatch.setattr(Decompose, "calculate", None)
+
+        s = Splitter(self.week_demand, self.min_length, self.max_length)
+        s.calculate()
+
+        assert lookups == [3]
+        assert s.get_shifts() == expected
+
+    def test_cache_writes_are_batched(self, monkeypatch):
+        monkeypatch.setattr(config, "WINDOW_PROCESSES", 1)
+        cache.flush()
+
+        writes = []
+        monkeypatch.setattr(cache.backend, "set",
+                            lambda key, value: writes.append([key]))
+        monkeypatch.setattr(cache.backend, "set_multi",
+                            lambda values: writes.append(list(values)))
+
+        s = Splitter(self.week_demand, self.min_length, self.max_length)
+        shifts = s.iter_shifts()
+        next(shifts)
+        assert writes == []
+
+        list(shifts)
+        assert len(writes) == 1
+        # Edge smoothing leaves two distinct window demands
+        assert len(writes[0]) == 2
@@ -0,0 +1,57 @@
+from chomp.shift_collection import ShiftCollection
+from chomp.transposition_table import TranspositionTable
+
+
+class TestTranspositionTable():
+    def setup_method(self, method):
+        self.table = TranspositionTable(2)
+
+    def teardown_method(self, method):
+        pass
+
+    def test_prunes_repeats_without_improvement(self):
+        assert self.table.is_dominated("a", 10) is False
+        assert self.table.is_dominated("a", 10) is True
+        assert self.table.is_dominated("a", 11) is True
+        assert self.table.hits == 2
+
+        # Improvements are explored and remembered
+        assert self.table.is_dominated("a", 9) is False
+        assert self.table.is_dominated("a", 10) is True
+
+    def test_evicts_least_recently_used(self):
+        self.table.is_dominated("a", 10)
+        self.table.is_dominated("b", 10)
+        self.table.is_dominated("a", 10)  # a is now most recently used
+        self.table.is_dominated("c", 10)
+
+        assert len(self.table) == 2
+        assert self.table.is_dominated("a", 10) is True
+        assert self.table.is_dominated("b", 10) is False
+
+    def test_zero_size_disables(self):
+        table = TranspositionTable(0)
+        assert table.is_dominated("a", 10) is False
+        assert table.is_dominated("a", 10) is False
+        assert len(table) == 0
+
+    def test_shift_orders_reach_same_state(self):
+        demand = [2, 2, 2, 2, 1, 1]
+        first = ShiftCollection(2, 4, demand=demand)
+        second = ShiftCollection(2, 4, demand=demand)
+
+        for shift in [(0, 2), (0, 4), (2, 2)]:
+            first.add_shift(shift)
+        for shift in [(0, 4), (0, 2), (2, 2)]:
+            second.add_shift(shift)
+
+        assert first.get_state_key() == second.get_state_key()
+
+        second.add_shift((4, 2))
+        assert first.get_state_key() != second.get_state_key()
+
+    def test_state_keys_have_fixed_size(self):
+        short = ShiftCollection(2, 4, demand=[2, 2, 1, 1])
+        long = ShiftCollection(2, 4, demand=[2, 2, 1, 1] * 30)
+
+        assert len(short.get_state_key()) == len(long.get_state_key())
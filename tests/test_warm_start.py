@@ -0,0 +1,89 @@
+from chomp import Decompose, cache, config, warm_start
+from chomp.coverage import get_coverage
+
+
+class TestWarmStart():
+    def setup_method(self, method):
+        cache.flush()
+
+    def teardown_method(self, method):
+        cache.flush()
+
+    @staticmethod
+    def use_local_solutions(monkeypatch):
+        """Keep solutions in a dict so tests do not depend on memcached"""
+        solutions = {}
+
+        def get_solutions(limit, **family):
+            return solutions.get(tuple(sorted(family.items())), [])
+
+        def add_solution(demand, shifts, limit, **family):
+            key = tuple(sorted(family.items()))
+            solutions[key] = (
+                [(demand, shifts)] + solutions.get(key, []))[:limit]
+
+        monkeypatch.setattr(cache, "get_solutions", get_solutions)
+        monkeypatch.setattr(cache, "add_solution", add_solution)
+        monkeypatch.setattr(config, "THREADS", 1)
+        monkeypatch.setattr(config, "WARM_START", True)
+        return solutions
+
+    def test_adapt_shifts_meets_demand(self):
+        demand = [1, 2, 3, 3, 2, 1]
+        shifts = [(0, 4), (1, 5), (2, 4), (2, 2), (2, 2)]
+
+        adapted = warm_start._adapt_shifts(demand, shifts, 2)
+
+        coverage = get_coverage(adapted, len(demand))
+        assert all(covered >= wanted
+                   for covered, wanted in zip(coverage, demand))
+        # The short shifts were only overage, as was the end of the long one
+        assert sorted(adapted) == [(0, 4), (1, 4), (2, 4)]
+
+    def test_adapt_shifts_repairs_deficit(self):
+        demand = [2, 2, 3, 3, 2, 1]
+        shifts = [(0, 6), (1, 4)]
+
+        adapted = warm_start._adapt_shifts(demand, shifts, 2)
+
+        coverage = get_coverage(adapted, len(demand))
+        assert all(covered >= wanted
+                   for covered, wanted in zip(coverage, demand))
+
+    def test_similar_demand_starts_warm(self, monkeypatch):
+        self.use_local_solutions(monkeypatch)
+        monkeypatch.setattr(config, "HEURISTICS", ["min_length_fill"])
+        min_length = 4
+        max_length = 8
+
+        d = Decompose([2, 3, 3, 4, 4, 1, 1, 5], min_length, max_length)
+        d.calculate()
+
+        cold = Decompose([2, 3, 3, 5, 4, 1, 1, 5], min_length, max_length)
+        heuristic = cold.use_heuristics_to_generate_some_solution()
+        warm = warm_start.find_warm_start(cold)
+        assert warm is not None
+        assert warm.demand_is_met
+        assert warm.coverage_sum < heuristic.coverage_sum
+
+        # The search still returns the same shifts as without a warm start
+        cache.flush()
+        cold.calculate()
+        monkeypatch.setattr(config, "WARM_START", False)
+        expected = Decompose([2, 3, 3, 5, 4, 1, 1, 5], min_length, max_length)
+        cache.flush()
+        expected.calculate()
+        assert cold.get_shifts() == expected.get_shifts()
+
+    def test_distant_demand_is_ignored(self, monkeypatch):
+        self.use_local_solutions(monkeypatch)
+
+        d = Decompose([1, 1, 1, 1, 1, 1], 2, 3)
+        d.calculate()
+
+        far = Decompose([4, 4, 4, 1, 1, 1], 2, 3)
+        assert warm_start.find_warm_start(far) is None
+
+        # Demands that are covered everywhere are used however far they are
+        near = Decompose([1, 0, 0, 0, 0, 1], 2, 3)
+        assert warm_start.find_warm_start(near) is not None